@@ -3,5 +3,6 @@ from . import network
 from . import plotting
 from . import model
 from . import simulation
+from . import simulation_kernels
 from . import dhn_from_osm
 from . import optimization
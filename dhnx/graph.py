@@ -11,9 +11,20 @@ available from its original location:
 SPDX-License-Identifier: MIT
 """
 
+import numpy as np
 import pandas as pd
 import networkx as nx
 
+from .helpers import Dict
+
+try:
+    from shapely.geometry import MultiLineString
+    from shapely.ops import linemerge
+
+except ImportError:
+    MultiLineString = None
+    linemerge = None
+
 
 def thermal_network_to_nx_graph(thermal_network):
     r"""
@@ -58,59 +69,1852 @@ def thermal_network_to_nx_graph(thermal_network):
 
     nodes = pd.concat(nodes.values(), sort=True)
 
-    node_attrs = {node_id: dict(data) for node_id, data in nodes.iterrows()}
+    node_attrs = nodes.to_dict('index')
 
     nx.set_node_attributes(nx_graph, node_attrs)
 
     return nx_graph
 
 
-def nx_graph_to_thermal_network(nx_graph):
+node_types = {
+    'consumer': 'consumers',
+    'producer': 'producers',
+    'fork': 'forks',
+    'split': 'forks',
+}
+
+
+def _get_component_ids(labels, list_name):
+    r"""
+    Returns the ids of the components with the given node labels. Labels like
+    'consumers-3' keep their id, otherwise the components are numbered consecutively.
+    """
+    labels = pd.Index(labels).astype(str)
+
+    prefix = list_name + '-'
+
+    ids = labels.str[len(prefix):]
+
+    if labels.str.startswith(prefix).all() and ids.str.isdigit().all():
+        ids = ids.astype(int)
+
+        if ids.is_unique:
+            return ids
+
+    return pd.RangeIndex(len(labels))
+
+
+def nx_graph_to_thermal_network(nx_graph, thermal_network):
     r"""
-    Creates ThermalNetwork from nx.MultiDigraph
+    Writes the nodes and edges of a nx.MultiDigraph as components into a ThermalNetwork,
+    usually a new, empty one. Use :meth:`dhnx.network.ThermalNetwork.from_nx_graph`
+    to create a ThermalNetwork from a graph.
+
+    The nodes are split into consumers, producers and forks by their attribute
+    `node_type`, which is 'consumer', 'producer' or 'fork' (or 'split'), ignoring case.
+    Nodes without a known `node_type` are split by their label, e.g. 'consumers-3'.
+    Nodes labeled like this keep their id, other nodes are numbered consecutively and
+    the pipes are relabeled accordingly. The edges become the pipes, with their
+    attribute `id` as id if given.
 
     Parameters
     ----------
     nx_graph : nx.MultiDigraph
 
+    thermal_network : dhnx.network.ThermalNetwork
+
     Returns
     -------
-    thermal_network : ThermalNetwork
+    thermal_network : dhnx.network.ThermalNetwork
     """
-    raise NotImplementedError('This feature is not implemented yet.')
+    nodes = pd.DataFrame.from_dict(dict(nx_graph.nodes(data=True)), orient='index')
 
+    nodes = nodes.reindex(pd.Index(list(nx_graph.nodes()), dtype=object))
 
-def write_edge_data_to_graph(series, graph_in, var_name=None):
+    if 'node_type' in nodes:
+        list_names = nodes['node_type'].astype(str).str.lower().map(node_types)
+
+    else:
+        list_names = pd.Series(np.nan, index=nodes.index, dtype=object)
+
+    list_names = list_names.fillna(
+        pd.Series(nodes.index.astype(str).str.split('-').str[0], index=nodes.index)
+    )
+
+    unknown = ~list_names.isin(node_types.values())
+
+    if unknown.any():
+        raise ValueError(
+            f"Nodes {list(nodes.index[unknown][:10])} have no node_type out of "
+            f"{list(node_types.keys())}."
+        )
+
+    labels = pd.Series(index=nodes.index, dtype=object)
+
+    for list_name in ['consumers', 'producers', 'forks']:
+        component = nodes.loc[list_names == list_name]
+
+        ids = _get_component_ids(component.index, list_name)
+
+        labels[component.index] = (list_name + '-' + ids.astype(str)).values
+
+        component = component.dropna(axis=1, how='all')
+
+        component.index = pd.Index(ids, name='id')
+
+        thermal_network.components[list_name] = component
+
+    pipes = nx.to_pandas_edgelist(nx_graph, source='from_node', target='to_node')
+
+    pipes['from_node'] = pipes['from_node'].map(labels)
+
+    pipes['to_node'] = pipes['to_node'].map(labels)
+
+    if 'id' in pipes:
+        pipes = pipes.set_index('id')
+
+    pipes.index.name = 'id'
+
+    thermal_network.components['pipes'] = pipes
+
+    return thermal_network
+
+
+class NodeIndex():
     r"""
-    Writes data describing the edges to the graph. Data has to
-    be a pd.Series labeled with the (from, to). If the series has
-    a name, the data will be stored in the graph under that name.
-    If not, `var_name` has to be provided.
+    Interned identifiers of the nodes of a thermal network.
+
+    Every node label like 'consumers-3' is mapped once to an integer id, its position
+    in `labels`. The kind of component and the id of the component within its table
+    are held in arrays of the same order, so nodes can be looked up, filtered and
+    compared by integer arrays instead of splitting their labels.
 
     Parameters
     ----------
-    series
-    graph_in
-    var_name
+    labels : pd.Index
+        Unique labels of the nodes
 
-    Returns
-    -------
+    kinds : pd.Categorical
+        Name of the component list of every node, e.g. 'consumers'
 
+    component_ids : np.ndarray
+        Id of every node in its component table
     """
-    graph = graph_in.copy()
+    list_names = ['consumers', 'producers', 'forks']
 
-    assert isinstance(series, pd.Series), \
-        "Have to pass a pandas Series."
+    def __init__(self, labels, kinds, component_ids):
+        self.labels = pd.Index(labels)
 
-    if var_name:
-        pass
-    elif series.name:
-        var_name = series.name
-    else:
-        raise ValueError(r"Have to either pass Series with name or provide var_name.")
+        if not self.labels.is_unique:
+            raise ValueError(
+                f"Nodes {list(self.labels[self.labels.duplicated()][:10])} are not unique."
+            )
 
-    for index, value in series.iteritems():
+        self.kinds = pd.Categorical(kinds, categories=self.list_names)
 
-        graph.edges[index][var_name] = value
+        self.component_ids = np.asarray(component_ids, dtype=object)
 
-    return graph
+    @classmethod
+    def from_thermal_network(cls, thermal_network):
+        r"""
+        Creates the node index from the component tables of a thermal network
+        in the order consumers, producers, forks.
+
+        Parameters
+        ----------
+        thermal_network : dhnx.network.ThermalNetwork
+
+        Returns
+        -------
+        node_index : NodeIndex
+        """
+        components = [thermal_network.components[name] for name in cls.list_names]
+
+        labels = np.concatenate([
+            name + '-' + component.index.astype(str).values.astype(object)
+            for name, component in zip(cls.list_names, components)
+        ])
+
+        kinds = pd.Categorical.from_codes(
+            np.repeat(np.arange(len(components)), [len(c) for c in components]),
+            categories=cls.list_names
+        )
+
+        component_ids = np.concatenate([
+            component.index.values.astype(object) for component in components
+        ])
+
+        return cls(labels, kinds, component_ids)
+
+    @classmethod
+    def from_labels(cls, labels):
+        r"""
+        Creates the node index from labels like 'consumers-3', which are split once.
+        Labels without a known kind of component get no kind.
+
+        Parameters
+        ----------
+        labels : list-like of str
+
+        Returns
+        -------
+        node_index : NodeIndex
+        """
+        labels = pd.Index(labels)
+
+        parts = labels.astype(str).str.split('-', n=1)
+
+        return cls(labels, parts.str[0], parts.str[1])
+
+    def __len__(self):
+        return len(self.labels)
+
+    def take(self, ids):
+        r"""
+        Returns the node index of a subset of nodes, renumbered in the given order.
+        """
+        return NodeIndex(self.labels[ids], self.kinds[ids], self.component_ids[ids])
+
+    def get_indexer(self, labels):
+        r"""
+        Returns the integer ids of the given labels, -1 for unknown labels. Categorical
+        labels are looked up by their categories.
+        """
+        if isinstance(getattr(labels, 'dtype', None), pd.CategoricalDtype):
+            labels = pd.Categorical(labels)
+
+            ids = np.append(self.labels.get_indexer(labels.categories), -1)
+
+            return ids[labels.codes].astype(np.int64)
+
+        return self.labels.get_indexer(labels).astype(np.int64)
+
+    def get_ids(self, labels):
+        r"""
+        Returns the integer ids of the given labels.
+
+        Raises
+        ------
+        ValueError
+            If a label is not in the index.
+        """
+        ids = self.get_indexer(labels)
+
+        if (ids < 0).any():
+            raise ValueError(f"Node {np.asarray(labels)[ids < 0][0]} not defined.")
+
+        return ids
+
+    def get_labels(self, ids):
+        return self.labels[ids]
+
+    def get_kinds(self, ids):
+        r"""
+        Returns the kinds of the given nodes as pd.Categorical. Negative ids, as
+        returned by :meth:`get_indexer` for unknown labels, get no kind.
+        """
+        ids = np.asarray(ids, dtype=np.int64)
+
+        codes = np.where(ids >= 0, self.kinds.codes[ids], -1)
+
+        return pd.Categorical.from_codes(codes, categories=self.list_names)
+
+    def get_nodes_of(self, list_name):
+        r"""
+        Returns the integer ids of the nodes of a kind of component, e.g. 'consumers'.
+        """
+        return np.flatnonzero(self.kinds == list_name).astype(np.int64)
+
+    def to_frame(self):
+        r"""
+        Returns the lookup table of the nodes, indexed by their integer id.
+
+        Returns
+        -------
+        table : pd.DataFrame
+            Columns `label`, `kind` and `component_id`
+        """
+        return pd.DataFrame({
+            'label': self.labels,
+            'kind': self.kinds,
+            'component_id': self.component_ids,
+        })
+
+
+class CompactTopology():
+    r"""
+    Topology of a thermal network held in arrays instead of Python objects.
+
+    The nodes are numbered by integer ids in the order of `nodes` and the edges by
+    their position. Every edge is given by the ids of its `from_node` and `to_node`.
+    The attributes of nodes and edges are held as columns of pd.DataFrame in the same
+    order. Adjacencies are built on first access in compressed sparse row (CSR) format:
+    the entries of node `i` are `entries[indptr[i]:indptr[i + 1]]`.
+
+    Parameters
+    ----------
+    nodes : pd.DataFrame
+        Attributes of the nodes, indexed by their labels
+
+    edges : pd.DataFrame
+        Attributes of the edges with the columns `from_node` and `to_node` holding
+        the labels of the nodes
+
+    node_index : NodeIndex
+        Interned ids of the nodes in the order of `nodes`. Defaults to splitting the
+        labels of the nodes.
+    """
+    def __init__(self, nodes, edges, node_index=None):
+        self.node_attrs = nodes
+
+        if node_index is None:
+            node_index = NodeIndex.from_labels(nodes.index)
+
+        self.node_index = node_index
+
+        self.nodes = node_index.labels
+
+        self.from_node = node_index.get_ids(edges['from_node'].values)
+
+        self.to_node = node_index.get_ids(edges['to_node'].values)
+
+        self.edge_attrs = edges.drop(columns=['from_node', 'to_node'])
+
+        self._adjacency = {}
+
+    @classmethod
+    def from_thermal_network(cls, thermal_network):
+        r"""
+        Creates the topology of a thermal network. The nodes are the consumers,
+        producers and forks, labeled like 'consumers-0', the edges are the pipes.
+
+        Parameters
+        ----------
+        thermal_network : dhnx.network.ThermalNetwork
+
+        Returns
+        -------
+        topology : CompactTopology
+        """
+        node_index = thermal_network.node_index
+
+        nodes = pd.concat([
+            thermal_network.components[list_name] for list_name in node_index.list_names
+        ], sort=True)
+
+        nodes.index = node_index.labels
+
+        edges = thermal_network.components['pipes']
+
+        if edges.empty:
+            edges = pd.DataFrame(columns=['from_node', 'to_node'])
+
+        return cls(nodes, edges, node_index)
+
+    @classmethod
+    def from_nx_graph(cls, graph):
+        r"""
+        Creates the topology of a networkx graph.
+
+        Parameters
+        ----------
+        graph : nx.DiGraph
+
+        Returns
+        -------
+        topology : CompactTopology
+        """
+        nodes = pd.DataFrame.from_dict(dict(graph.nodes(data=True)), orient='index')
+
+        nodes = nodes.reindex(pd.Index(list(graph.nodes()), dtype=object))
+
+        edges = nx.to_pandas_edgelist(graph, source='from_node', target='to_node')
+
+        return cls(nodes, edges)
+
+    def to_nx_graph(self):
+        r"""
+        Creates a networkx graph with the nodes, edges and their attributes.
+
+        Returns
+        -------
+        graph : nx.DiGraph
+        """
+        graph = nx.DiGraph()
+
+        graph.add_nodes_from(zip(self.nodes, self.node_attrs.to_dict('records')))
+
+        graph.add_edges_from(zip(
+            self.nodes[self.from_node],
+            self.nodes[self.to_node],
+            self.edge_attrs.to_dict('records')
+        ))
+
+        return graph
+
+    @property
+    def n_nodes(self):
+        return len(self.nodes)
+
+    @property
+    def n_edges(self):
+        return len(self.from_node)
+
+    def get_nodes_of(self, list_name):
+        r"""
+        Returns the ids of the nodes of a kind of component, e.g. 'consumers'.
+        """
+        return self.node_index.get_nodes_of(list_name)
+
+    def in_degree(self):
+        return np.bincount(self.to_node, minlength=self.n_nodes)
+
+    def out_degree(self):
+        return np.bincount(self.from_node, minlength=self.n_nodes)
+
+    def degree(self):
+        return self.in_degree() + self.out_degree()
+
+    @staticmethod
+    def _get_csr(n_nodes, keys):
+        r"""
+        Sorts entries by the node they belong to.
+
+        Returns
+        -------
+        indptr : np.ndarray
+            Start of the entries of every node in `entries`
+
+        entries : np.ndarray
+            Positions of the entries, sorted by node
+        """
+        entries = np.argsort(keys, kind='stable')
+
+        indptr = np.zeros(n_nodes + 1, dtype=np.int64)
+
+        indptr[1:] = np.cumsum(np.bincount(keys, minlength=n_nodes))
+
+        return indptr, entries
+
+    def get_adjacency(self, direction='out'):
+        r"""
+        Returns an adjacency in CSR format.
+
+        Parameters
+        ----------
+        direction : str
+            'out' for the edges leaving a node, 'in' for the edges entering a node and
+            'both' for all edges of a node. With 'both', an entry `e` below the number
+            of edges is edge `e` leaving the node, otherwise edge `e - n_edges`
+            entering the node.
+
+        Returns
+        -------
+        indptr : np.ndarray
+
+        entries : np.ndarray
+        """
+        if direction not in self._adjacency:
+            if direction == 'out':
+                keys = self.from_node
+
+            elif direction == 'in':
+                keys = self.to_node
+
+            elif direction == 'both':
+                keys = np.concatenate([self.from_node, self.to_node])
+
+            else:
+                raise ValueError(f"Unknown direction '{direction}'.")
+
+            self._adjacency[direction] = self._get_csr(self.n_nodes, keys)
+
+        return self._adjacency[direction]
+
+    @staticmethod
+    def get_entries(nodes, indptr, entries):
+        r"""
+        Returns the entries of all given nodes in an adjacency, concatenated.
+        """
+        counts = indptr[nodes + 1] - indptr[nodes]
+
+        offsets = np.repeat(indptr[nodes] - np.cumsum(counts) + counts, counts)
+
+        return entries[offsets + np.arange(counts.sum())]
+
+    def get_levels(self, roots):
+        r"""
+        Traverses the topology breadth-first from the roots, ignoring the direction
+        of the edges.
+
+        Parameters
+        ----------
+        roots : np.ndarray
+            Ids of the nodes to start from
+
+        Returns
+        -------
+        depth : np.ndarray
+            Number of edges between every node and the roots, -1 if not reached
+
+        parent_edge : np.ndarray
+            Edge through which every node was reached, -1 for the roots and nodes
+            not reached
+        """
+        indptr, entries = self.get_adjacency('both')
+
+        others = np.concatenate([self.to_node, self.from_node])
+
+        depth = np.full(self.n_nodes, -1, dtype=np.int64)
+
+        parent_edge = np.full(self.n_nodes, -1, dtype=np.int64)
+
+        frontier = np.asarray(roots, dtype=np.int64)
+
+        depth[frontier] = 0
+
+        level = 0
+
+        while len(frontier):
+            adjacent = self.get_entries(frontier, indptr, entries)
+
+            nodes = others[adjacent]
+
+            new = depth[nodes] < 0
+
+            level += 1
+
+            depth[nodes[new]] = level
+
+            parent_edge[nodes[new]] = adjacent[new] % self.n_edges
+
+            frontier = np.unique(nodes[new])
+
+        return depth, parent_edge
+
+    def get_topological_levels(self):
+        r"""
+        Returns the topological generation of every node along the direction of the
+        edges, -1 for nodes on or behind a cycle.
+        """
+        indptr, entries = self.get_adjacency('out')
+
+        in_degree = self.in_degree()
+
+        levels = np.full(self.n_nodes, -1, dtype=np.int64)
+
+        frontier = np.flatnonzero(in_degree == 0)
+
+        level = 0
+
+        while len(frontier):
+            levels[frontier] = level
+
+            targets = self.to_node[self.get_entries(frontier, indptr, entries)]
+
+            np.subtract.at(in_degree, targets, 1)
+
+            frontier = np.unique(targets[in_degree[targets] == 0])
+
+            level += 1
+
+        return levels
+
+    def without_isolated_nodes(self):
+        r"""
+        Returns the topology without the nodes that no edge connects to.
+
+        Returns
+        -------
+        topology : CompactTopology
+        """
+        connected = self.degree() > 0
+
+        edges = self.edge_attrs.copy()
+
+        edges['from_node'] = self.nodes[self.from_node]
+
+        edges['to_node'] = self.nodes[self.to_node]
+
+        return CompactTopology(
+            self.node_attrs[connected], edges, self.node_index.take(np.flatnonzero(connected))
+        )
+
+
+class TreeIndex():
+    r"""
+    Index of the tree of a topology for queries in constant or logarithmic time.
+
+    The tree is spanned breadth-first from the roots, usually the producers, ignoring
+    the direction of the edges. The nodes are numbered in depth-first preorder, the
+    order of an Euler tour, so the subtree of a node is the contiguous range of
+    `size[node]` entries of `order` starting at `tin[node]`. Ancestors are found by
+    binary lifting: `ancestors[k]` holds the ancestor of every node `2 ** k` levels up.
+
+    Nodes not reached from the roots form trees of their own. Edges that are not part
+    of the tree, i.e. that close loops, have no `downstream` node.
+
+    Parameters
+    ----------
+    topology : CompactTopology
+        Topology of the network
+
+    roots : np.ndarray
+        Ids of the nodes to span the tree from
+    """
+    def __init__(self, topology, roots):
+        self.topology = topology
+
+        self.roots = np.asarray(roots, dtype=np.int64)
+
+        n_nodes = topology.n_nodes
+
+        self.depth, self.parent_edge = topology.get_levels(self.roots)
+
+        reached = np.flatnonzero(self.parent_edge >= 0)
+
+        self.downstream = np.full(topology.n_edges, -1, dtype=np.int64)
+
+        self.downstream[self.parent_edge[reached]] = reached
+
+        in_tree = self.downstream >= 0
+
+        self.upstream = np.where(
+            in_tree, topology.from_node + topology.to_node - self.downstream, -1
+        )
+
+        self.sign = np.where(in_tree, np.where(topology.to_node == self.downstream, 1, -1), 0)
+
+        self.parent = np.full(n_nodes, -1, dtype=np.int64)
+
+        self.parent[reached] = self.upstream[self.parent_edge[reached]]
+
+        self.is_tree = bool(in_tree.all() and (self.depth >= 0).all())
+
+        order = np.argsort(self.depth, kind='stable')
+
+        order = order[self.depth[order] >= 0]
+
+        self.levels = np.split(
+            order, np.searchsorted(self.depth[order], np.arange(1, self.depth.max(initial=0) + 1))
+        ) if len(order) else []
+
+        self._set_preorder()
+
+        self._set_ancestors()
+
+    def _set_preorder(self):
+        r"""
+        Numbers the nodes in depth-first preorder and determines the size of their
+        subtrees. Nodes not reached from the roots are numbered last.
+        """
+        n_nodes = self.topology.n_nodes
+
+        self.size = np.ones(n_nodes, dtype=np.int64)
+
+        for level in self.levels[:0:-1]:
+            np.add.at(self.size, self.parent[level], self.size[level])
+
+        self.tin = np.empty(n_nodes, dtype=np.int64)
+
+        self.root = np.full(n_nodes, -1, dtype=np.int64)
+
+        tops = np.concatenate([self.roots, np.flatnonzero(self.depth < 0)])
+
+        self.tin[tops] = np.cumsum(self.size[tops]) - self.size[tops]
+
+        self.root[tops] = tops
+
+        for level in self.levels[1:]:
+            # the subtrees of the children follow each other after their parent
+            level = level[np.argsort(self.parent[level], kind='stable')]
+
+            parents = self.parent[level]
+
+            offset = np.cumsum(self.size[level]) - self.size[level]
+
+            first = np.flatnonzero(np.r_[True, parents[1:] != parents[:-1]])
+
+            offset -= np.repeat(offset[first], np.diff(np.append(first, len(level))))
+
+            self.tin[level] = self.tin[parents] + 1 + offset
+
+            self.root[level] = self.root[parents]
+
+        self.order = np.empty(n_nodes, dtype=np.int64)
+
+        self.order[self.tin] = np.arange(n_nodes)
+
+    def _set_ancestors(self):
+        r"""
+        Sets up the table of ancestors for binary lifting. Roots are their own parent.
+        """
+        n_levels = max(1, int(self.depth.max(initial=0)).bit_length())
+
+        self.ancestors = np.empty((n_levels, self.topology.n_nodes), dtype=np.int64)
+
+        self.ancestors[0] = np.where(
+            self.parent >= 0, self.parent, np.arange(self.topology.n_nodes)
+        )
+
+        for k in range(1, n_levels):
+            self.ancestors[k] = self.ancestors[k - 1][self.ancestors[k - 1]]
+
+    def is_ancestor(self, ancestors, nodes):
+        r"""
+        Returns whether nodes lie in the subtrees of other nodes. Every node is an
+        ancestor of itself.
+
+        Parameters
+        ----------
+        ancestors : int or np.ndarray
+        nodes : int or np.ndarray
+
+        Returns
+        -------
+        is_ancestor : bool or np.ndarray
+        """
+        position = self.tin[nodes]
+
+        return (self.tin[ancestors] <= position) & \
+            (position < self.tin[ancestors] + self.size[ancestors])
+
+    def is_on_path_to_root(self, edges, nodes):
+        r"""
+        Returns whether edges lie on the paths from nodes to their roots.
+
+        Parameters
+        ----------
+        edges : int or np.ndarray
+        nodes : int or np.ndarray
+
+        Returns
+        -------
+        is_on_path : bool or np.ndarray
+        """
+        downstream = self.downstream[edges]
+
+        return (downstream >= 0) & self.is_ancestor(downstream, nodes)
+
+    def is_in_subtrees(self, nodes):
+        r"""
+        Returns whether every node lies in the subtree of any of the given nodes.
+
+        Parameters
+        ----------
+        nodes : np.ndarray
+            Ids of the nodes whose subtrees are marked
+
+        Returns
+        -------
+        is_in_subtrees : np.ndarray
+            Boolean mask of all nodes
+        """
+        nodes = np.asarray(nodes, dtype=np.int64)
+
+        # +1 at the start and -1 behind the end of every subtree's range in preorder
+        bounds = np.zeros(self.topology.n_nodes + 1, dtype=np.int64)
+
+        np.add.at(bounds, self.tin[nodes], 1)
+
+        np.add.at(bounds, self.tin[nodes] + self.size[nodes], -1)
+
+        return np.cumsum(bounds[:-1])[self.tin] > 0
+
+    def get_subtree(self, node):
+        r"""
+        Returns the ids of the nodes in the subtree of a node in preorder,
+        starting with the node itself.
+        """
+        return self.order[self.tin[node]:self.tin[node] + self.size[node]]
+
+    def get_subtree_sums(self, values):
+        r"""
+        Sums up values of the nodes over the subtree of every node.
+
+        Parameters
+        ----------
+        values : np.ndarray
+            Values with the nodes along the first axis
+
+        Returns
+        -------
+        sums : np.ndarray
+            Sums of the same shape as `values`
+        """
+        values = np.asarray(values)
+
+        cumulated = np.zeros((len(values) + 1,) + values.shape[1:], dtype=values.dtype)
+
+        np.cumsum(values[self.order], axis=0, out=cumulated[1:])
+
+        return cumulated[self.tin + self.size] - cumulated[self.tin]
+
+    def get_path_to_root(self, node):
+        r"""
+        Returns the edges on the path from a node to its root, starting at the node.
+
+        Returns
+        -------
+        edges : np.ndarray
+        """
+        edges = []
+
+        parent_edge = self.parent_edge.tolist()
+
+        parent = self.parent.tolist()
+
+        while parent_edge[node] >= 0:
+            edges.append(parent_edge[node])
+
+            node = parent[node]
+
+        return np.array(edges, dtype=np.int64)
+
+    def get_lca(self, nodes_a, nodes_b):
+        r"""
+        Returns the lowest common ancestors of pairs of nodes, -1 for nodes in different
+        trees.
+
+        Parameters
+        ----------
+        nodes_a : int or np.ndarray
+        nodes_b : int or np.ndarray
+
+        Returns
+        -------
+        lca : int or np.ndarray
+        """
+        scalar = np.ndim(nodes_a) == 0 and np.ndim(nodes_b) == 0
+
+        nodes_a, nodes_b = np.broadcast_arrays(
+            np.asarray(nodes_a, dtype=np.int64), np.asarray(nodes_b, dtype=np.int64)
+        )
+
+        deeper = self.depth[nodes_a] < self.depth[nodes_b]
+
+        a = np.where(deeper, nodes_b, nodes_a).ravel()
+
+        b = np.where(deeper, nodes_a, nodes_b).ravel()
+
+        difference = self.depth[a] - self.depth[b]
+
+        for k, ancestors in enumerate(self.ancestors):
+            lift = (difference >> k) & 1 == 1
+
+            a[lift] = ancestors[a[lift]]
+
+        for ancestors in self.ancestors[::-1]:
+            lift = ancestors[a] != ancestors[b]
+
+            a[lift] = ancestors[a[lift]]
+
+            b[lift] = ancestors[b[lift]]
+
+        lca = np.where(a == b, a, self.ancestors[0][a])
+
+        lca = np.where(self.root[a] == self.root[b], lca, -1).reshape(nodes_a.shape)
+
+        return int(lca) if scalar else lca
+
+
+class EdgeAttributeStore():
+    r"""
+    Attributes of the edges of a graph, held as one array per attribute in the
+    order of the graph's edges.
+
+    Attributes are attached or swapped by reference without copying the graph or
+    the data. An attribute can have any number of leading dimensions, e.g. one row
+    per time step, as long as its last dimension runs over the edges. The attributes
+    are only written to a networkx graph on demand.
+
+    Parameters
+    ----------
+    edges : iterable of tuple
+        Edges as (from_node, to_node) in the order of the graph's edges
+    """
+    def __init__(self, edges):
+        self.edges = list(edges)
+
+        self.edge_index = {edge: i for i, edge in enumerate(self.edges)}
+
+        self.attributes = {}
+
+    @classmethod
+    def from_graph(cls, graph):
+        r"""
+        Creates an empty store aligned with the edges of a graph.
+
+        Parameters
+        ----------
+        graph : nx.DiGraph
+
+        Returns
+        -------
+        store : EdgeAttributeStore
+        """
+        return cls(graph.edges())
+
+    def __len__(self):
+        return len(self.edges)
+
+    def __contains__(self, name):
+        return name in self.attributes
+
+    def __getitem__(self, name):
+        return self.attributes[name]
+
+    def __setitem__(self, name, values):
+        self.set(name, values)
+
+    def set(self, name, values):
+        r"""
+        Attaches an attribute. An array is stored by reference, a pd.Series
+        labeled with (from_node, to_node) is aligned with the edges first.
+
+        Parameters
+        ----------
+        name : str
+            Name of the attribute
+
+        values : np.ndarray or pd.Series
+            Values of the attribute, the last dimension running over the edges
+        """
+        if isinstance(values, pd.Series):
+            values = values.reindex(self.edges).values
+
+        values = np.asanyarray(values)
+
+        if values.shape[-1:] != (len(self.edges),):
+            raise ValueError(
+                f"Attribute '{name}' has shape {values.shape}, but the last dimension "
+                f"has to be the number of edges {len(self.edges)}."
+            )
+
+        self.attributes[name] = values
+
+    def get(self, name, edge):
+        r"""
+        Returns the value of an attribute of a single edge.
+
+        Parameters
+        ----------
+        name : str
+            Name of the attribute
+
+        edge : tuple
+            Edge as (from_node, to_node)
+        """
+        return self.attributes[name][..., self.edge_index[edge]]
+
+    def to_series(self, name, index=None):
+        r"""
+        Returns an attribute as pd.Series labeled with (from_node, to_node).
+
+        Parameters
+        ----------
+        name : str
+            Name of the attribute
+
+        index : int or tuple
+            Index into the leading dimensions, e.g. the position of a time step.
+            Required if the attribute has leading dimensions.
+
+        Returns
+        -------
+        series : pd.Series
+        """
+        values = self.attributes[name]
+
+        if index is not None:
+            values = values[index]
+
+        return pd.Series(
+            values,
+            index=pd.MultiIndex.from_tuples(self.edges, names=('from_node', 'to_node')),
+            name=name
+        )
+
+    def write_to_graph(self, graph, names=None, index=None, copy=True):
+        r"""
+        Writes attributes to the edges of a networkx graph.
+
+        Parameters
+        ----------
+        graph : nx.DiGraph
+            Graph with the edges of the store
+
+        names : list of str
+            Attributes to write. Defaults to all attributes.
+
+        index : int or tuple
+            Index into the leading dimensions of the attributes, see :meth:`to_series`
+
+        copy : bool
+            If True, the attributes are written to a copy of the graph.
+
+        Returns
+        -------
+        graph : nx.DiGraph
+        """
+        if copy:
+            graph = graph.copy()
+
+        if names is None:
+            names = list(self.attributes)
+
+        for name in names:
+            values = self.attributes[name]
+
+            if index is not None:
+                values = values[index]
+
+            nx.set_edge_attributes(graph, dict(zip(self.edges, values.tolist())), name)
+
+        return graph
+
+
+def write_edge_data_to_graph(series, graph_in, var_name=None):
+    r"""
+    Writes data describing the edges to the graph. Data has to
+    be a pd.Series labeled with the (from, to). If the series has
+    a name, the data will be stored in the graph under that name.
+    If not, `var_name` has to be provided.
+
+    Parameters
+    ----------
+    series
+    graph_in
+    var_name
+
+    Returns
+    -------
+
+    """
+    graph = graph_in.copy()
+
+    assert isinstance(series, pd.Series), \
+        "Have to pass a pandas Series."
+
+    if var_name:
+        pass
+    elif series.name:
+        var_name = series.name
+    else:
+        raise ValueError(r"Have to either pass Series with name or provide var_name.")
+
+    missing = [edge for edge in series.index if not graph.has_edge(*edge)]
+
+    if missing:
+        raise KeyError(f"The edges {missing} are not in the graph.")
+
+    nx.set_edge_attributes(graph, series.to_dict(), var_name)
+
+    return graph
+
+
+def collapse_degree_2_forks(thermal_network):
+    r"""
+    Simplifies a thermal network by merging chains of pipes through forks with exactly
+    one incoming and one outgoing pipe into one pipe.
+
+    A fork is only removed if both of its pipes have the same attributes apart from
+    their length and geometry and the same sequences, e.g. `temp_env`, and if it has no
+    localized pressure loss coefficients or sequences of its own. The merged pipe keeps
+    the id, the attributes and the sequences of the first pipe of the chain, ends at the
+    last pipe's `to_node` and has the summed length. If the pipes have a column
+    `geometry`, the lines of a chain are merged.
+
+    Parameters
+    ----------
+    thermal_network : dhnx.network.ThermalNetwork
+
+    Returns
+    -------
+    simplified : dhnx.network.ThermalNetwork
+        Network without the removed forks
+
+    mapping : pd.DataFrame
+        For every original pipe, the id `pipe` of the merged pipe it is part of, its
+        own `from_node` and `to_node`, the nodes `simplified_from_node` and
+        `simplified_to_node` of the merged pipe, its `length_share` of the merged
+        pipe and its `flow_share`, which is 1. Can be passed to
+        :func:`expand_pipe_results`.
+    """
+    topology = thermal_network.topology
+
+    pipes = thermal_network.components['pipes']
+
+    n_pipes = topology.n_edges
+
+    positions = np.arange(n_pipes)
+
+    in_pipe = np.full(topology.n_nodes, -1, dtype=np.int64)
+
+    in_pipe[topology.to_node] = positions
+
+    out_pipe = np.full(topology.n_nodes, -1, dtype=np.int64)
+
+    out_pipe[topology.from_node] = positions
+
+    removable = np.zeros(topology.n_nodes, dtype=bool)
+
+    removable[topology.get_nodes_of('forks')] = True
+
+    removable &= (topology.in_degree() == 1) & (topology.out_degree() == 1)
+
+    kept = topology.node_index.get_indexer(_get_forks_with_data(thermal_network))
+
+    removable[kept[kept >= 0]] = False
+
+    # the pipes before and after a fork have to be equal apart from their length
+    attrs = [
+        name for name in pipes.columns
+        if name not in ['from_node', 'to_node', 'length_m', 'geometry']
+    ]
+
+    if attrs:
+        hashes = pd.util.hash_pandas_object(pipes[attrs], index=False).values
+
+    else:
+        hashes = np.zeros(n_pipes, dtype=np.uint64)
+
+    candidates = np.flatnonzero(removable)
+
+    before, after = in_pipe[candidates], out_pipe[candidates]
+
+    equal = hashes[before] == hashes[after]
+
+    # and have the same sequences, pipes without a column of a sequence are NaN
+    for sequence in thermal_network.sequences.get('pipes', {}).values():
+        values = sequence.reindex(columns=pipes.index.astype(str)).values.astype(float)
+
+        equal &= (
+            (values[:, before] == values[:, after])
+            | (np.isnan(values[:, before]) & np.isnan(values[:, after]))
+        ).all(axis=0)
+
+    removable[candidates] = equal
+
+    # every pipe is followed by the outgoing pipe of its to_node, if that is removed
+    next_pipe = np.where(removable[topology.to_node], out_pipe[topology.to_node], -1)
+
+    chain = [-1] * n_pipes
+
+    order = []
+
+    next_list = next_pipe.tolist()
+
+    for head in np.flatnonzero(~removable[topology.from_node]).tolist():
+        pipe = head
+
+        while pipe >= 0:
+            chain[pipe] = head
+
+            order.append(pipe)
+
+            pipe = next_list[pipe]
+
+    chain = np.array(chain, dtype=np.int64)
+
+    # pipes in closed loops of removable forks are not reached and are kept
+    in_loop = chain < 0
+
+    chain[in_loop] = positions[in_loop]
+
+    next_pipe[in_loop] = -1
+
+    removable[topology.to_node[in_loop]] = False
+
+    heads = np.unique(chain)
+
+    end_node = np.empty(n_pipes, dtype=np.int64)
+
+    end_node[chain[next_pipe < 0]] = topology.to_node[next_pipe < 0]
+
+    simplified_pipes = pipes.iloc[heads].copy()
+
+    simplified_pipes['to_node'] = topology.nodes[end_node[heads]].values
+
+    mapping = pd.DataFrame({
+        'pipe': pipes.index[chain],
+        'from_node': topology.nodes[topology.from_node].values,
+        'to_node': topology.nodes[topology.to_node].values,
+        'simplified_from_node': topology.nodes[topology.from_node[chain]].values,
+        'simplified_to_node': topology.nodes[end_node[chain]].values,
+    }, index=pipes.index)
+
+    if 'length_m' in pipes:
+        length = pipes['length_m'].values.astype(float)
+
+        chain_length = np.bincount(chain, weights=length, minlength=n_pipes)
+
+        simplified_pipes['length_m'] = chain_length[heads]
+
+        mapping['length_share'] = length / chain_length[chain]
+
+    else:
+        mapping['length_share'] = np.nan
+
+    mapping['flow_share'] = 1.0
+
+    if 'geometry' in pipes:
+        simplified_pipes['geometry'] = _merge_chain_geometries(
+            pipes['geometry'], chain, np.array(order, dtype=np.int64), heads
+        )
+
+    removed_forks = topology.node_index.component_ids[removable]
+
+    simplified = thermal_network.copy()
+
+    simplified.components['forks'] = simplified.components['forks'].drop(removed_forks)
+
+    simplified.components['pipes'] = simplified_pipes
+
+    removed_pipes = pipes.index.delete(heads).astype(str)
+
+    for name, sequence in simplified.sequences.get('pipes', {}).items():
+        simplified.sequences['pipes'][name] = sequence.drop(
+            columns=removed_pipes, errors='ignore'
+        )
+
+    if simplified.memory_optimized:
+        simplified.optimize_memory()
+
+    return simplified, mapping
+
+
+def _merge_chain_geometries(geometry, chain, order, heads):
+    r"""
+    Returns the geometries of the merged pipes. The lines of the pipes of a chain,
+    given in the order of the chain, are merged into one line.
+    """
+    merged = geometry.iloc[heads].values.copy()
+
+    counts = np.bincount(chain, minlength=len(chain))
+
+    long_chains = counts[chain[order]] > 1
+
+    parts = pd.Series(geometry.values[order[long_chains]], index=chain[order[long_chains]])
+
+    positions = pd.Index(heads)
+
+    if len(parts) and linemerge is None:
+        raise ImportError("Shapely has to be installed to merge the geometries of the pipes.")
+
+    for head, lines in parts.groupby(level=0, sort=False):
+        if lines.notna().all():
+            merged[positions.get_loc(head)] = linemerge(MultiLineString(list(lines)))
+
+    return merged
+
+
+def _get_forks_with_data(thermal_network):
+    r"""
+    Returns the labels of the forks that have localized pressure loss coefficients
+    or sequences of their own.
+    """
+    forks = thermal_network.components['forks']
+
+    columns = [name for name in ['zeta_inlet', 'zeta_return'] if name in forks]
+
+    ids = list(forks.index[forks[columns].notna().any(axis=1)])
+
+    for sequence in thermal_network.sequences.get('forks', {}).values():
+        ids.extend(sequence.columns)
+
+    return ['forks-' + str(id) for id in ids]
+
+
+def expand_pipe_results(data, mapping, extensive=False, share='length_share'):
+    r"""
+    Expands results of a network simplified by :func:`collapse_degree_2_forks` or
+    :func:`aggregate_consumers` to the original pipes. Every original pipe gets the
+    value of the merged pipe it is part of. Extensive quantities like heat losses or
+    pressure losses are shared by the pipes of a chain in proportion to their length.
+
+    Parameters
+    ----------
+    data : pd.DataFrame or pd.Series
+        Results with a column for every merged pipe, labeled by the pipe's id or by
+        (from_node, to_node)
+
+    mapping : pd.DataFrame
+        Mapping of the pipes returned by :func:`collapse_degree_2_forks` or
+        :func:`aggregate_consumers`
+
+    extensive : bool
+        If True, the values are multiplied by the pipes' share.
+
+    share : str
+        Column of the mapping holding the shares, 'length_share' or 'flow_share'.
+        The mass flow of an equivalent pipe is expanded with 'flow_share'.
+
+    Returns
+    -------
+    expanded : pd.DataFrame or pd.Series
+        Results with a column for every original pipe, labeled like `data`
+    """
+    if isinstance(data, pd.Series):
+        return expand_pipe_results(data.to_frame().T, mapping, extensive, share).iloc[0]
+
+    if isinstance(data.columns, pd.MultiIndex):
+        expanded = data.reindex(columns=pd.MultiIndex.from_arrays(
+            [mapping['simplified_from_node'], mapping['simplified_to_node']]
+        ))
+
+        expanded.columns = pd.MultiIndex.from_arrays(
+            [mapping['from_node'], mapping['to_node']], names=data.columns.names
+        )
+
+    else:
+        expanded = data.reindex(columns=mapping['pipe'].values)
+
+        expanded.columns = mapping.index
+
+    if extensive:
+        expanded = expanded * mapping[share].values
+
+    return expanded
+
+
+def aggregate_consumers(thermal_network, by='branch', cell_size=None):
+    r"""
+    Reduces a tree network by replacing groups of consumers with representative
+    consumers.
+
+    The consumers are grouped per branch, i.e. by the node they are connected to, per
+    cell of a grid of geographic coordinates or by given labels. Seen from the
+    producer, every part of the tree that only supplies consumers of one group is
+    replaced by one representative consumer, which is connected by an equivalent pipe
+    to the node where the part branches off. Pipes supplying consumers of several
+    groups are kept, so a group branching off at several nodes gets a representative
+    at each of them.
+
+    A representative keeps the id of its first consumer, lies at the mean coordinates
+    and has the summed `mass_flow` and `heat_flow`, both as scalars and sequences. Its
+    `temperature_drop` is the mean, weighted by the mass flow if that is given. An
+    equivalent pipe keeps the id and attributes of the first replaced pipe at the
+    branching node and has no geometry. Its length is the longest path to one of the
+    replaced consumers, its cross section is the sum of those of the replaced pipes at
+    the branching node and its heat transfer coefficient is scaled so that the product
+    of heat transfer coefficient, diameter and length, which determines the heat
+    losses, equals the sum over all replaced pipes.
+
+    Parameters
+    ----------
+    thermal_network : dhnx.network.ThermalNetwork
+        Network whose pipes form a tree with one producer
+
+    by : str or pd.Series
+        'branch', 'cell' or a group label for every consumer id. Consumers without
+        a label are not grouped with others.
+
+    cell_size : float
+        Edge length of the grid cells in degrees, needed to group by 'cell'
+
+    Returns
+    -------
+    aggregated : dhnx.network.ThermalNetwork
+        Network with the representative consumers
+
+    mapping : dict
+        `consumers`: For every original consumer, the id `consumer` of its
+        representative and its `share` of the representative's demand. Can be passed
+        to :func:`expand_consumer_results`.
+
+        `pipes`: For every original pipe, the same columns as the mapping of
+        :func:`collapse_degree_2_forks` and the `flow_share` of the equivalent pipe's
+        mass flow. Can be passed to :func:`expand_pipe_results`.
+    """
+    topology = thermal_network.topology
+
+    node_index = topology.node_index
+
+    n_nodes, n_pipes = topology.n_nodes, topology.n_edges
+
+    producers = topology.get_nodes_of('producers')
+
+    consumer_nodes = topology.get_nodes_of('consumers')
+
+    if len(producers) != 1:
+        raise ValueError("Consumers can only be aggregated in networks with one producer.")
+
+    tree_index = thermal_network.tree_index
+
+    if not tree_index.is_tree:
+        raise ValueError("Consumers can only be aggregated in tree networks.")
+
+    depth, parent_edge, parent_node = tree_index.depth, tree_index.parent_edge, tree_index.parent
+
+    downstream, upstream = tree_index.downstream, tree_index.upstream
+
+    consumer_ids = pd.Index(node_index.component_ids[consumer_nodes].tolist())
+
+    groups = _get_consumer_groups(
+        thermal_network, consumer_ids, parent_node[consumer_nodes], by, cell_size
+    )
+
+    demand = _get_consumer_demand(thermal_network, consumer_ids)
+
+    n_groups = groups.max() + 1 if len(groups) else 0
+
+    # label every node with the group of the consumers it supplies, -2 for several groups
+    node_min = np.full(n_nodes, n_groups, dtype=np.int64)
+
+    node_max = np.full(n_nodes, -1, dtype=np.int64)
+
+    node_min[consumer_nodes] = node_max[consumer_nodes] = groups
+
+    mixed = np.zeros(n_nodes, dtype=bool)
+
+    label = np.full(n_nodes, -1, dtype=np.int64)
+
+    levels = tree_index.levels
+
+    for level in levels[::-1]:
+        supplied = node_max[level] >= 0
+
+        label[level] = np.where(supplied, node_max[level], -1)
+
+        label[level[mixed[level] | supplied & (node_min[level] != node_max[level])]] = -2
+
+        parents = parent_node[level]
+
+        if (parents < 0).all():
+            break
+
+        mixed[parents[label[level] == -2]] = True
+
+        np.minimum.at(node_min, parents, np.where(label[level] >= 0, label[level], n_groups))
+
+        np.maximum.at(node_max, parents, label[level])
+
+    # the parts supplying one group are numbered by group and branching node
+    pipe_label = label[downstream]
+
+    top = (pipe_label >= 0) & ((label[upstream] != pipe_label) | (depth[upstream] == 0))
+
+    unit = np.full(n_pipes, -1, dtype=np.int64)
+
+    unit[top], keys = pd.factorize(pipe_label[top] * n_nodes + upstream[top])
+
+    attach = keys % n_nodes
+
+    n_units = len(keys)
+
+    length = _get_pipe_attribute(thermal_network, 'length_m')
+
+    distance = np.zeros(n_nodes)
+
+    for level in levels[1:]:
+        pipes = parent_edge[level]
+
+        inner = (pipe_label[pipes] >= 0) & ~top[pipes]
+
+        unit[pipes[inner]] = unit[parent_edge[parent_node[level[inner]]]]
+
+        distance[level] = distance[parent_node[level]] + length[pipes]
+
+    replaced = unit >= 0
+
+    removed_nodes = downstream[replaced]
+
+    members = removed_nodes[node_index.kinds[removed_nodes] == 'consumers']
+
+    member_units = unit[parent_edge[members]]
+
+    representative = np.full(n_units, n_nodes, dtype=np.int64)
+
+    np.minimum.at(representative, member_units, members)
+
+    # demands of the units, falling back to the number of consumers without demand
+    weight = np.zeros((n_nodes, 2))
+
+    weight[consumer_nodes] = np.column_stack([demand, np.ones(len(demand))])
+
+    unit_weight = np.zeros((n_units, 2))
+
+    np.add.at(unit_weight, member_units, weight[members])
+
+    by_count = (unit_weight[:, 0] <= 0).astype(np.int64)
+
+    member_weight = weight[members, by_count[member_units]]
+
+    weight = tree_index.get_subtree_sums(weight)
+
+    pipe_weight = weight[downstream[replaced], by_count[unit[replaced]]]
+
+    share = pd.Series(1.0, index=thermal_network.components['consumers'].index)
+
+    member_ids = pd.Index(node_index.component_ids[members].tolist())
+
+    share.loc[member_ids] = \
+        member_weight / unit_weight[member_units, by_count[member_units]]
+
+    # equivalent pipes
+    pipes = thermal_network.components['pipes']
+
+    first = np.full(n_units, n_pipes, dtype=np.int64)
+
+    np.minimum.at(first, unit[top], np.flatnonzero(top))
+
+    path_length = np.zeros(n_units)
+
+    np.maximum.at(path_length, member_units, distance[members] - distance[attach[member_units]])
+
+    # a part consisting of one pipe is kept as it is
+    single = np.bincount(unit[replaced], minlength=n_units) == 1
+
+    merged = ~single
+
+    equivalent = pipes.iloc[first[merged]].copy()
+
+    unit_from_node = np.where(
+        single, topology.nodes[topology.from_node[first]], topology.nodes[attach]
+    )
+
+    unit_to_node = np.where(
+        single, topology.nodes[topology.to_node[first]], topology.nodes[representative]
+    )
+
+    equivalent['from_node'] = unit_from_node[merged]
+
+    equivalent['to_node'] = unit_to_node[merged]
+
+    if 'length_m' in pipes:
+        equivalent['length_m'] = path_length[merged]
+
+    diameter = _get_pipe_attribute(thermal_network, 'diameter_mm')
+
+    equivalent_diameter = np.sqrt(
+        np.bincount(unit[top], weights=diameter[top] ** 2, minlength=n_units)
+    )
+
+    if 'diameter_mm' in pipes:
+        equivalent['diameter_mm'] = equivalent_diameter[merged]
+
+    if 'heat_transfer_coefficient_W/mK' in pipes:
+        heat_transfer = _get_pipe_attribute(thermal_network, 'heat_transfer_coefficient_W/mK')
+
+        # heat losses are proportional to heat transfer coefficient, diameter and length
+        equivalent['heat_transfer_coefficient_W/mK'] = (np.bincount(
+            unit[replaced], weights=(heat_transfer * diameter * length)[replaced],
+            minlength=n_units
+        ) / (equivalent_diameter * path_length))[merged]
+
+    if 'geometry' in pipes:
+        equivalent['geometry'] = None
+
+    kept = ~replaced
+
+    kept[first[single]] = True
+
+    aggregated_pipes = pd.concat([pipes[kept], equivalent])
+
+    kept[first] = True
+
+    aggregated_pipes = aggregated_pipes.loc[pipes.index[kept]]
+
+    # pipe mapping
+    unit_length = np.bincount(unit[replaced], weights=length[replaced], minlength=n_units)
+
+    pipe_map = pd.DataFrame({
+        'pipe': pipes.index,
+        'from_node': topology.nodes[topology.from_node].values,
+        'to_node': topology.nodes[topology.to_node].values,
+        'simplified_from_node': topology.nodes[topology.from_node].values,
+        'simplified_to_node': topology.nodes[topology.to_node].values,
+        'length_share': 1.0,
+        'flow_share': 1.0,
+    }, index=pipes.index)
+
+    pipe_map.loc[replaced, 'pipe'] = pipes.index[first[unit[replaced]]]
+
+    pipe_map.loc[replaced, 'simplified_from_node'] = unit_from_node[unit[replaced]]
+
+    pipe_map.loc[replaced, 'simplified_to_node'] = unit_to_node[unit[replaced]]
+
+    pipe_map.loc[replaced, 'length_share'] = length[replaced] / unit_length[unit[replaced]]
+
+    pipe_map.loc[replaced, 'flow_share'] = \
+        pipe_weight / unit_weight[unit[replaced], by_count[unit[replaced]]]
+
+    # representative consumers
+    representative_ids = node_index.component_ids[representative]
+
+    consumer_map = pd.DataFrame({'consumer': share.index, 'share': share.values}, index=share.index)
+
+    consumer_map.loc[member_ids, 'consumer'] = representative_ids[member_units]
+
+    aggregated = thermal_network.copy()
+
+    consumers = thermal_network.components['consumers']
+
+    consumers = pd.concat([
+        consumers.drop(member_ids),
+        _aggregate_consumer_table(consumers.loc[member_ids], member_units, representative_ids)
+    ])
+
+    aggregated.components['consumers'] = \
+        consumers.loc[share.index[share.index.isin(consumers.index)]]
+
+    removed_forks = node_index.component_ids[
+        removed_nodes[node_index.kinds[removed_nodes] == 'forks']
+    ]
+
+    aggregated.components['forks'] = aggregated.components['forks'].drop(removed_forks)
+
+    aggregated.components['pipes'] = aggregated_pipes
+
+    relabel = dict(zip(
+        topology.nodes[members], topology.nodes[representative[member_units]]
+    ))
+
+    for list_name, component in aggregated.components.items():
+        if list_name not in node_index.list_names + ['pipes'] and 'node' in component:
+            component['node'] = component['node'].astype(object).replace(relabel)
+
+    aggregated.sequences['consumers'] = _aggregate_consumer_sequences(
+        thermal_network.sequences.get('consumers', {}), member_ids, member_units,
+        representative_ids
+    )
+
+    for name, sequence in aggregated.sequences.get('forks', {}).items():
+        aggregated.sequences['forks'][name] = sequence.drop(
+            columns=pd.Index(removed_forks).astype(str), errors='ignore'
+        )
+
+    if aggregated.memory_optimized:
+        aggregated.optimize_memory()
+
+    return aggregated, Dict(consumers=consumer_map, pipes=pipe_map)
+
+
+def _get_consumer_groups(thermal_network, ids, parent_nodes, by, cell_size):
+    r"""
+    Returns the group of every consumer as integer code. Consumers without a group
+    get a group of their own.
+    """
+    if isinstance(by, pd.Series):
+        labels = by.reindex(ids).values
+
+    elif by == 'branch':
+        labels = parent_nodes
+
+    elif by == 'cell':
+        if cell_size is None:
+            raise ValueError("A cell_size is needed to aggregate consumers per cell.")
+
+        consumers = thermal_network.components['consumers'].loc[ids]
+
+        cells = np.floor(consumers[['lat', 'lon']].values.astype(float) / cell_size)
+
+        labels = pd.Series(list(map(tuple, cells)), dtype=object)
+
+        labels[np.isnan(cells).any(axis=1)] = None
+
+        labels = labels.values
+
+    else:
+        raise ValueError(f"Consumers cannot be aggregated by '{by}'.")
+
+    groups, uniques = pd.factorize(labels)
+
+    missing = groups < 0
+
+    groups[missing] = len(uniques) + np.arange(missing.sum())
+
+    return groups.astype(np.int64)
+
+
+def _get_consumer_demand(thermal_network, ids):
+    r"""
+    Returns the demand of the consumers by which they share the results of their
+    representative: the scalar mass flow or heat flow or the sum of their sequences.
+    Without any of them, the demand is zero.
+    """
+    consumers = thermal_network.components['consumers'].loc[ids]
+
+    sequences = thermal_network.sequences.get('consumers', {})
+
+    for name in ['mass_flow', 'heat_flow']:
+        if name in consumers and consumers[name].notna().all():
+            return consumers[name].values.astype(float)
+
+    for name in ['mass_flow', 'heat_flow']:
+        if name in sequences:
+            demand = sequences[name].sum().reindex(ids.astype(str))
+
+            return demand.fillna(0).values.astype(float)
+
+    return np.zeros(len(ids))
+
+
+def _get_pipe_attribute(thermal_network, name):
+    r"""
+    Returns an attribute of the pipes as float array, zero if it is not given.
+    """
+    pipes = thermal_network.components['pipes']
+
+    if name not in pipes:
+        return np.zeros(len(pipes))
+
+    return pipes[name].values.astype(float)
+
+
+def _aggregate_consumer_table(members, units, representative_ids):
+    r"""
+    Returns the table of the representative consumers from the table of their members
+    and the representative each of them belongs to.
+    """
+    grouped = members.groupby(units, sort=True)
+
+    table = grouped.first()
+
+    numeric = [
+        name for name in members.columns if pd.api.types.is_float_dtype(members[name])
+    ]
+
+    for name in numeric:
+        if name in ['mass_flow', 'heat_flow']:
+            table[name] = grouped[name].sum(min_count=1)
+
+        elif name == 'temperature_drop' and 'mass_flow' in members:
+            table[name] = _get_weighted_mean(
+                members[[name]].values, members[['mass_flow']].values, units
+            )[0]
+
+        else:
+            table[name] = grouped[name].mean()
+
+    table.index = pd.Index(representative_ids[table.index].tolist(), name=members.index.name)
+
+    return table[members.columns]
+
+
+def _get_weighted_mean(values, weights, groups):
+    r"""
+    Returns the mean of the values of every group, weighted e.g. by the mass flow.
+    Missing weights count as zero. Groups whose weights do not sum up to a positive
+    value get the plain mean.
+
+    Parameters
+    ----------
+    values : np.ndarray
+        Values with the members along the first axis
+
+    weights : np.ndarray
+        Weights of the same shape
+
+    groups : np.ndarray
+        Group of every member
+
+    Returns
+    -------
+    mean : pd.DataFrame
+        Mean with the sorted groups as index
+    """
+    values = np.asarray(values, dtype=float)
+
+    weights = np.where(np.isnan(values), 0, np.nan_to_num(np.asarray(weights, dtype=float)))
+
+    weight_sum = pd.DataFrame(weights).groupby(groups).sum()
+
+    weighted = pd.DataFrame(np.nan_to_num(values) * weights).groupby(groups).sum()
+
+    plain = pd.DataFrame(values).groupby(groups).mean()
+
+    positive = weight_sum > 0
+
+    return (weighted / weight_sum.where(positive, 1)).where(positive, plain)
+
+
+def _aggregate_consumer_sequences(sequences, member_ids, units, representative_ids):
+    r"""
+    Returns the sequences of the consumers with the columns of the members replaced
+    by one column for every representative.
+    """
+    aggregated = Dict()
+
+    columns = member_ids.astype(str)
+
+    mass_flow = sequences.get('mass_flow')
+
+    for name, sequence in sequences.items():
+        present = columns.isin(sequence.columns)
+
+        values = sequence[columns[present]].astype(float)
+
+        groups = units[present]
+
+        if name in ['mass_flow', 'heat_flow']:
+            values = values.T.groupby(groups).sum().T
+
+        elif name == 'temperature_drop' and mass_flow is not None:
+            weights = mass_flow.reindex(columns=columns[present]).values
+
+            values = pd.DataFrame(
+                _get_weighted_mean(values.values.T, weights.T, groups).T.values,
+                index=values.index,
+                columns=np.unique(groups)
+            )
+
+        else:
+            values = values.T.groupby(groups).mean().T
+
+        values.columns = pd.Index(representative_ids[values.columns].tolist()).astype(str)
+
+        kept = sequence.drop(columns=columns[present])
+
+        values = pd.concat([kept, values], axis=1)
+
+        aggregated[name] = values[sequence.columns[sequence.columns.isin(values.columns)]]
+
+    return aggregated
+
+
+def expand_consumer_results(data, mapping, extensive=False):
+    r"""
+    Expands results of a network reduced by :func:`aggregate_consumers` to the
+    original consumers. Every consumer gets the value of its representative.
+    Extensive quantities like the delivered heat are shared in proportion to the
+    consumers' demand.
+
+    Parameters
+    ----------
+    data : pd.DataFrame or pd.Series
+        Results with a column for every representative consumer, labeled by the
+        consumer's id or by its node label like 'consumers-0'
+
+    mapping : pd.DataFrame
+        Mapping of the consumers returned by :func:`aggregate_consumers`
+
+    extensive : bool
+        If True, the values are multiplied by the consumers' `share`.
+
+    Returns
+    -------
+    expanded : pd.DataFrame or pd.Series
+        Results with a column for every original consumer, labeled like `data`
+    """
+    if isinstance(data, pd.Series):
+        return expand_consumer_results(data.to_frame().T, mapping, extensive).iloc[0]
+
+    representatives = mapping['consumer'].values
+
+    consumers = mapping.index
+
+    if len(data.columns) and data.columns.astype(str).str.startswith('consumers-').all():
+        representatives = 'consumers-' + mapping['consumer'].astype(str).values
+
+        consumers = 'consumers-' + consumers.astype(str)
+
+    expanded = data.reindex(columns=representatives)
+
+    expanded.columns = consumers
+
+    if extensive:
+        expanded = expanded * mapping['share'].values
+
+    return expanded
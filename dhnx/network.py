@@ -11,17 +11,32 @@ available from its original location:
 SPDX-License-Identifier: MIT
 """
 
+import contextlib
+import hashlib
 import os
 
 import numpy as np
 import pandas as pd
 
-from .graph import thermal_network_to_nx_graph
+try:
+    import pyproj
+
+except ImportError:
+    pyproj = None
+
+try:
+    import shapely
+
+except ImportError:
+    shapely = None
+
+from .graph import thermal_network_to_nx_graph, nx_graph_to_thermal_network, \
+    collapse_degree_2_forks, aggregate_consumers, CompactTopology, NodeIndex, TreeIndex
 from .optimization import optimize_operation, setup_optimise_investment, \
     solve_optimisation_investment
 from .helpers import Dict
 from .input_output import CSVNetworkImporter, CSVNetworkExporter, load_component_attrs
-from .simulation import simulate
+from .simulation import simulate, simulate_design
 
 dir_name = os.path.dirname(__file__)
 
@@ -43,19 +58,47 @@ default_attrs = {
     } for list_name, attrs in component_attrs.items()
 }
 
+attr_types = {
+    list_name: {
+        attr: specs.type for attr, specs in attrs.items()
+    } for list_name, attrs in component_attrs.items()
+}
+
+categorical_attrs = ['from_node', 'to_node', 'node_type', 'hp_type']
 
-class ThermalNetwork():
+
+# The network is the entry point for all functions of the package, e.g. simulation,
+# optimization and graph operations, and exposes each of them as a method.
+class ThermalNetwork():  # pylint: disable=too-many-public-methods
     r"""
     Class representing thermal (heating/cooling) networks.
 
     Parameters
     ----------
+    dirname : str
+        Folder to import the network from
+    optimize_memory : bool
+        If True, the tables are compacted with :meth:`optimize_memory` on import and
+        when components are added, which changes the dtypes of their columns.
+        Default: False
+
+    Attributes
+    ----------
     availalable_components
     component_attrs
     components
     sequences
     results
-    graph
+    graph : nx.DiGraph
+        Graph of the network, built on first access and cached until the nodes or
+        pipes change by :meth:`add`, :meth:`add_many`, :meth:`remove`, :meth:`batch` or
+        assigning a new table. After editing a table in place, call
+        :meth:`invalidate_cache`. It is shared, so it should not be modified.
+    topology : CompactTopology
+        Topology of the network, cached like `graph`
+    node_index : NodeIndex
+        Integer ids of the nodes with their kind and component id, cached like `graph`
+    simulation_model
 
     Examples
     --------
@@ -64,7 +107,7 @@ class ThermalNetwork():
     >>> tnw.is_consistent()
     True
     """
-    def __init__(self, dirname=None):
+    def __init__(self, dirname=None, optimize_memory=False):
 
         self.available_components = available_components
         self.component_attrs = component_attrs
@@ -72,15 +115,24 @@ class ThermalNetwork():
         self.sequences = Dict()
         self.results = Dict()
         self.timeindex = None
-        self.graph = None
+        self.crs = 'EPSG:4326'
+        self.simulation_model = None
+        self._cache = {}
+        self._version = 0
+        self._hashes = {}
+        self._batch = None
+        self._memory_optimized = False
 
         if dirname is not None:
             try:
-                self.from_csv_folder(dirname)
+                self.from_csv_folder(dirname, optimize_memory=optimize_memory)
 
             except ImportError:
                 print('Failed to import file.')
 
+        elif optimize_memory:
+            self.optimize_memory()
+
     def __repr__(self):
         r"""
         This method defines what is returned if you perform print() or str()
@@ -97,11 +149,47 @@ class ThermalNetwork():
 
         return f"dhnx.network.ThermalNetwork object with these components\n{summary}"
 
-    def from_csv_folder(self, dirname):
+    @property
+    def memory_optimized(self):
+        r"""
+        True if the component tables are compacted by :meth:`optimize_memory`.
+        """
+        return self._memory_optimized
+
+    def copy(self):
+        r"""
+        Returns a copy of the network with copies of the component tables and sequences.
+        The copy has the same time index and coordinate reference system. Its tables are
+        compacted like the ones of the network, see :meth:`optimize_memory`. Results and
+        the simulation model are not copied.
+
+        Returns
+        -------
+        network : ThermalNetwork
+        """
+        network = ThermalNetwork(optimize_memory=self.memory_optimized)
+
+        for list_name, component in self.components.items():
+            network.components[list_name] = component.copy()
+
+        for list_name, sequences in self.sequences.items():
+            for name, sequence in sequences.items():
+                network.sequences[list_name][name] = sequence.copy()
+
+        network.timeindex = self.timeindex
+
+        network.crs = self.crs
+
+        return network
+
+    def from_csv_folder(self, dirname, optimize_memory=False):
         importer = CSVNetworkImporter(self, dirname)
 
         self = importer.load()
 
+        if optimize_memory:
+            self.optimize_memory()
+
         return self
 
     def to_csv_folder(self, dirname):
@@ -114,9 +202,261 @@ class ThermalNetwork():
 
         return nx_graph
 
+    @classmethod
+    def from_nx_graph(cls, nx_graph):
+        r"""
+        Creates a ThermalNetwork from a graph like the one of :meth:`to_nx_graph`. See
+        :func:`dhnx.graph.nx_graph_to_thermal_network`.
+        """
+        return nx_graph_to_thermal_network(nx_graph, cls())
+
+    def to_compact_topology(self):
+        topology = CompactTopology.from_thermal_network(self)
+
+        return topology
+
+    def to_tree_index(self):
+        r"""
+        Returns the index of the tree spanned from the producers for subtree, path and
+        ancestor queries. See :class:`dhnx.graph.TreeIndex`.
+        """
+        topology = self.topology
+
+        return TreeIndex(topology, topology.get_nodes_of('producers'))
+
+    def collapse_degree_2_forks(self):
+        r"""
+        Returns a simplified copy of the network, in which chains of pipes through
+        forks with one incoming and one outgoing pipe are merged, and the mapping of
+        the original pipes to the merged ones. See
+        :func:`dhnx.graph.collapse_degree_2_forks`.
+        """
+        return collapse_degree_2_forks(self)
+
+    def aggregate_consumers(self, by='branch', cell_size=None):
+        r"""
+        Returns a reduced copy of the network, in which groups of consumers are
+        replaced by representative consumers with equivalent pipes, and the mapping
+        of the original consumers and pipes to them. See
+        :func:`dhnx.graph.aggregate_consumers`.
+        """
+        return aggregate_consumers(self, by=by, cell_size=cell_size)
+
+    @property
+    def graph(self):
+        return self._get_cached('graph', self.to_nx_graph)
+
+    @property
+    def topology(self):
+        return self._get_cached('topology', self.to_compact_topology)
+
+    @property
+    def node_index(self):
+        return self._get_cached('node_index', lambda: NodeIndex.from_thermal_network(self))
+
+    @property
+    def tree_index(self):
+        return self._get_cached('tree_index', self.to_tree_index)
+
+    def invalidate_cache(self):
+        r"""
+        Marks the tables of nodes and pipes as changed, so that the graph, the topology,
+        the node and tree index and the hashes of :meth:`fingerprint` are rebuilt on
+        their next access. This is only needed after editing a table or a sequence in
+        place, e.g. with `.loc`. :meth:`add`, :meth:`add_many`, :meth:`remove`,
+        :meth:`batch` and assigning a new table are detected.
+        """
+        self._version += 1
+
+    def _get_topology_state(self):
+        r"""
+        Returns the state of the tables of nodes and pipes that the graph and the
+        topology are built from: the version, which is increased by changes in place,
+        and the tables together with their index and columns, which are replaced
+        by other changes.
+        """
+        references = []
+
+        for list_name in ['consumers', 'producers', 'forks', 'pipes']:
+            table = self.components[list_name]
+
+            references += [table, table.index, table.columns]
+
+        return self._version, references
+
+    def _get_cached(self, name, build):
+        r"""
+        Returns an object built from the nodes and pipes. It is cached and only rebuilt
+        if the tables changed since, e.g. by :meth:`add`, :meth:`remove` or assigning a
+        new table. The tables are compared by identity, not by their values.
+
+        Parameters
+        ----------
+        name : str
+            Name of the cached object
+
+        build : callable
+            Function that builds the object
+        """
+        version, references = self._get_topology_state()
+
+        cached_version, cached_references, cached = self._cache.get(name, (None, [], None))
+
+        if version != cached_version or len(references) != len(cached_references) or not all(
+                reference is cached_reference
+                for reference, cached_reference in zip(references, cached_references)
+        ):
+            cached = build()
+
+            self._cache[name] = (version, references, cached)
+
+        return cached
+
+    def fingerprint(self):
+        r"""
+        Returns a digest of the state of the network: its component tables, sequences,
+        time index and coordinate reference system. Networks in the same state have
+        the same fingerprint, so it can serve as a key for caches of e.g. simulation
+        plans, optimization models or imports.
+
+        Every table is hashed column by column from the raw values, together with its
+        index, columns and dtypes. Objects and categories are hashed with
+        :func:`pandas.util.hash_pandas_object`. Like the graph, the hash of a table is
+        reused as long as the table, its index and its columns are the same objects, so
+        a repeated call on an unchanged network does not read the tables. After editing
+        the values of a component table or a sequence in place, e.g. with `.loc`, call
+        :meth:`invalidate_cache`. The hashes of tables that are no longer part of the
+        network are dropped.
+
+        Returns
+        -------
+        fingerprint : str
+            Hexadecimal digest
+        """
+        tables = [(('components', name), table) for name, table in self.components.items()]
+
+        tables += [
+            (('sequences', list_name, name), sequence)
+            for list_name, sequences in self.sequences.items()
+            for name, sequence in sequences.items()
+        ]
+
+        digest = hashlib.blake2b(digest_size=16)
+
+        for key, table in sorted(tables, key=lambda item: item[0]):
+            digest.update(repr(key).encode())
+
+            digest.update(self._get_table_hash(key, table))
+
+        self._hashes = {key: self._hashes[key] for key, _ in tables}
+
+        if self.timeindex is not None:
+            digest.update(pd.util.hash_pandas_object(pd.Index(self.timeindex)).values)
+
+        digest.update(str(self.crs).encode())
+
+        return digest.hexdigest()
+
+    def _get_table_hash(self, key, table):
+        r"""
+        Returns the hash of a table, which is only recomputed if the table, its index or
+        its columns were replaced or :meth:`invalidate_cache` was called since the last
+        call with the same key.
+
+        Parameters
+        ----------
+        key : tuple
+            Key of the table, e.g. ('components', 'pipes')
+
+        table : pd.DataFrame or pd.Series
+
+        Returns
+        -------
+        hash : bytes
+        """
+        version, references = self._version, [table, table.index, table.columns]
+
+        cached_version, cached_references, cached = self._hashes.get(key, (None, [], None))
+
+        if version == cached_version and len(references) == len(cached_references) and all(
+                reference is cached_reference
+                for reference, cached_reference in zip(references, cached_references)
+        ):
+            return cached
+
+        if isinstance(table, pd.Series):
+            table = table.to_frame()
+
+        dtypes, arrays = self._get_table_arrays(table)
+
+        digest = hashlib.blake2b(repr(dtypes).encode(), digest_size=16)
+
+        for labels in [table.index, table.columns]:
+            digest.update(repr(list(labels.names)).encode())
+
+            digest.update(pd.util.hash_pandas_object(labels).values)
+
+        for values in arrays:
+            digest.update(self._get_raw_values(values, order='F').view(np.uint8))
+
+        self._hashes[key] = (version, references, digest.digest())
+
+        return self._hashes[key][2]
+
+    @staticmethod
+    def _get_table_arrays(table):
+        r"""
+        Returns the dtypes of a table and its values as arrays, a single 2-dimensional
+        array if all columns share a numeric dtype, one array per column otherwise.
+        """
+        dtypes = table.dtypes
+
+        if len(dtypes) and isinstance(dtypes.iloc[0], np.dtype) and dtypes.iloc[0] != object \
+                and (dtypes == dtypes.iloc[0]).all():
+            return (str(dtypes.iloc[0]), len(dtypes)), [table.to_numpy(copy=False)]
+
+        return [str(dtype) for dtype in dtypes], [
+            table.iloc[:, i].values for i in range(table.shape[1])
+        ]
+
+    @staticmethod
+    def _get_raw_values(values, order='K'):
+        r"""
+        Returns the values of an array as 1-dimensional contiguous numpy array. Values
+        that have no fixed size in memory, like objects or categories, are replaced by
+        their hashes.
+
+        Parameters
+        ----------
+        values : np.ndarray or pd.api.extensions.ExtensionArray
+
+        order : str
+            Order in which a 2-dimensional array is read. With 'K' (default), it is read
+            in the order of memory, which avoids a copy.
+
+        Returns
+        -------
+        raw_values : np.ndarray
+        """
+        if not isinstance(values, np.ndarray) or values.dtype == object:
+            values = pd.util.hash_pandas_object(pd.Series(values), index=False).values
+
+        return np.ascontiguousarray(values.ravel(order=order))
+
+    def _get_list_name(self, class_name):
+        r"""
+        Returns the name of the component list of a component class.
+        """
+        assert class_name in available_components.index,\
+            f"Component class {class_name} is not within the available components" \
+            f" {available_components.index}."
+
+        return available_components.at[class_name, 'list_name']
+
     def add(self, class_name, id, **kwargs):
         r"""
         Adds a row with id to the component DataFrame specified by class_name.
+        Within :meth:`batch`, the component is buffered and added on exit.
 
         Parameters
         ----------
@@ -124,14 +464,17 @@ class ThermalNetwork():
         id
         kwargs
         """
-        assert class_name in available_components.index,\
-            f"Component class {class_name} is not within the available components" \
-            f" {available_components.index}."
+        list_name = self._get_list_name(class_name)
 
-        list_name = available_components.loc[class_name].list_name
+        batch = self._batch.get(list_name) if self._batch is not None else None
 
-        assert id not in self.components[list_name].index,\
-            f"There is already a component with the id {id}."
+        if batch is not None:
+            assert not self._is_in_batch(list_name, id),\
+                f"There is already a component with the id {id}."
+
+        else:
+            assert id not in self.components[list_name].index,\
+                f"There is already a component with the id {id}."
 
         # check if required parameters are in kwargs
         missing_required = list(set(required_attrs[list_name]) - kwargs.keys())
@@ -141,6 +484,11 @@ class ThermalNetwork():
         if bool(missing_required):
             raise ValueError(f"Required attributes {missing_required} are not given")
 
+        if batch is not None:
+            batch['records'][id] = kwargs
+
+            return
+
         # if not defined in kwargs, set default attributes
         component_data = default_attrs[list_name].copy()
 
@@ -148,11 +496,152 @@ class ThermalNetwork():
 
         # add to component DataFrame
         for key, value in component_data.items():
+            column = self.components[list_name].get(key)
+
+            if column is not None and isinstance(column.dtype, pd.CategoricalDtype) \
+                    and not pd.isna(value) and value not in column.cat.categories:
+                self.components[list_name][key] = column.cat.add_categories([value])
+
             self.components[list_name].loc[id, key] = value
 
+        self.invalidate_cache()
+
+        self._add_node_categories(list_name, [id])
+
+    def add_many(self, class_name, components):
+        r"""
+        Adds several components at once to the component DataFrame specified by
+        class_name. Required attributes are checked and default attributes are set
+        for all components together before they are appended in one step.
+        Within :meth:`batch`, the components are buffered and added on exit.
+
+        Parameters
+        ----------
+        class_name : str
+            Name of the component class
+
+        components : pd.DataFrame or list of dict
+            Attributes of the components. A DataFrame is indexed by the ids or has a
+            column 'id', records have the key 'id'.
+        """
+        list_name = self._get_list_name(class_name)
+
+        components = self._prepare_components(list_name, components)
+
+        if self._batch is not None:
+            batch = self._batch.get(list_name)
+
+            duplicate_ids = components.index[components.index.duplicated() | [
+                self._is_in_batch(list_name, id) for id in components.index
+            ]]
+
+            assert duplicate_ids.empty,\
+                f"There are already components with the ids {list(duplicate_ids.unique())}."
+
+            batch['frames'].append(components)
+
+            batch['frame_ids'].update(components.index)
+
+            return
+
+        existing = self.components[list_name]
+
+        duplicate_ids = components.index[
+            components.index.duplicated() | components.index.isin(existing.index)
+        ]
+
+        assert duplicate_ids.empty,\
+            f"There are already components with the ids {list(duplicate_ids.unique())}."
+
+        if not (existing.empty and existing.columns.empty):
+            components = pd.concat([existing, components], sort=False)
+
+        if self._memory_optimized:
+            components = self._optimize_table_memory(list_name, components)
+
+        self.components[list_name] = components
+
+        self._add_node_categories(list_name, components.index)
+
+    def _add_node_categories(self, list_name, ids):
+        r"""
+        Adds the labels of new nodes to the categories of the columns `from_node` and
+        `to_node` of the pipes, if these are categorical.
+        """
+        if list_name not in NodeIndex.list_names:
+            return
+
+        pipes = self.components['pipes']
+
+        labels = list_name + '-' + pd.Index(ids).astype(str)
+
+        columns = {}
+
+        for name in ['from_node', 'to_node']:
+            if name in pipes and isinstance(pipes[name].dtype, pd.CategoricalDtype):
+                new_labels = labels.difference(pipes[name].cat.categories)
+
+                if len(new_labels):
+                    columns[name] = pipes[name].cat.add_categories(new_labels)
+
+        # the table is replaced, not modified, so that a batch can be rolled back
+        if columns:
+            pipes = pipes.copy(deep=False)
+
+            for name, column in columns.items():
+                pipes[name] = column
+
+            self.components['pipes'] = pipes
+
+    @staticmethod
+    def _prepare_components(list_name, components):
+        r"""
+        Returns the attributes of components as pd.DataFrame indexed by id, checking
+        that the required attributes are given and setting the default attributes.
+        """
+        if isinstance(components, pd.DataFrame):
+            components = components.copy()
+
+        else:
+            components = pd.DataFrame.from_records(list(components))
+
+            if 'id' not in components:
+                raise ValueError("The records have to contain the 'id' of the components.")
+
+        if 'id' in components:
+            components = components.set_index('id')
+
+        components.index.name = 'id'
+
+        # check if required parameters are given for all components
+        missing_required = set(required_attrs[list_name]) - set(components.columns) - {'id'}
+
+        if missing_required:
+            raise ValueError(f"Required attributes {sorted(missing_required)} are not given")
+
+        required = [attr for attr in required_attrs[list_name] if attr != 'id']
+
+        missing_values = components.index[components[required].isna().any(axis=1)]
+
+        if not missing_values.empty:
+            raise ValueError(
+                f"Required attributes are not given for the ids {list(missing_values)}"
+            )
+
+        # if not given, set default attributes
+        for key, value in default_attrs[list_name].items():
+            if key in components:
+                components[key] = components[key].fillna(value)
+
+            else:
+                components[key] = value
+
+        return components
+
     def remove(self, class_name, id):
         r"""
         Removes the row with id from the component DataFrame specified by class_name.
+        Within :meth:`batch`, the component is removed on exit.
 
         Parameters
         ----------
@@ -161,15 +650,201 @@ class ThermalNetwork():
         id : int
             id of the component to remove
         """
-        assert class_name in available_components.index,\
-            "Component class '{}' is not within the available_components."
+        list_name = self._get_list_name(class_name)
 
-        list_name = available_components.loc[class_name].list_name
+        if self._batch is None:
+            assert id in self.components[list_name].index,\
+                f"There is no component with the id {id}."
 
-        assert id in self.components[list_name].index,\
+            self.components[list_name].drop(id, inplace=True)
+
+            self.invalidate_cache()
+
+            return
+
+        batch = self._batch.get(list_name)
+
+        assert self._is_in_batch(list_name, id),\
             f"There is no component with the id {id}."
 
-        self.components[list_name].drop(id, inplace=True)
+        if id in batch['records']:
+            del batch['records'][id]
+
+        elif id in batch['frame_ids']:
+            batch['frame_ids'].remove(id)
+
+            batch['dropped_ids'].add(id)
+
+        else:
+            batch['removed_ids'].add(id)
+
+    def _is_in_batch(self, list_name, id):
+        r"""
+        Checks if a component exists, taking into account the changes buffered
+        in the current batch.
+        """
+        batch = self._batch[list_name]
+
+        if id in batch['records'] or id in batch['frame_ids']:
+            return True
+
+        return id in self.components[list_name].index and id not in batch['removed_ids']
+
+    @contextlib.contextmanager
+    def batch(self):
+        r"""
+        Context manager that buffers calls of :meth:`add`, :meth:`add_many` and
+        :meth:`remove` and applies them on exit, with one bulk operation per component
+        list. Afterwards, the consistency of the network is checked once.
+
+        If the block raises an exception, the buffered changes are discarded. If
+        applying them or the consistency check fails, the components are rolled back
+        to their state before the batch and the exception is raised. Nested batches
+        are part of the outermost one.
+
+        Examples
+        --------
+        >>> with tnw.batch():
+        ...     tnw.add('Consumer', 1, lat=0, lon=0)
+        ...     tnw.add('Pipe', 1, from_node='forks-0', to_node='consumers-1',
+        ...             length_m=10)
+        """
+        if self._batch is not None:
+            yield self
+
+            return
+
+        self._batch = Dict({
+            list_name: {
+                'records': {},
+                'frames': [],
+                'frame_ids': set(),
+                'dropped_ids': set(),
+                'removed_ids': set(),
+            } for list_name in self.components
+        })
+
+        try:
+            yield self
+
+        except BaseException:
+            self._batch = None
+
+            raise
+
+        batch, self._batch = self._batch, None
+
+        components = dict(self.components)
+
+        try:
+            for list_name, changes in batch.items():
+                self._apply_batch(list_name, changes)
+
+            self.is_consistent()
+
+        except BaseException:
+            for list_name, data in components.items():
+                self.components[list_name] = data
+
+            raise
+
+    def _apply_batch(self, list_name, changes):
+        r"""
+        Applies the changes to one component list buffered in a batch.
+        """
+        if changes['removed_ids']:
+            self.components[list_name] = self.components[list_name].drop(
+                list(changes['removed_ids'])
+            )
+
+        frames = [
+            frame.loc[~frame.index.isin(list(changes['dropped_ids']))]
+            for frame in changes['frames']
+        ]
+
+        if changes['records']:
+            frames.append(self._prepare_components(list_name, [
+                dict(kwargs, id=id) for id, kwargs in changes['records'].items()
+            ]))
+
+        if not frames:
+            return
+
+        class_name = available_components.index[
+            available_components.list_name == list_name
+        ][0]
+
+        self.add_many(class_name, pd.concat(frames, sort=False))
+
+    def optimize_memory(self):
+        r"""
+        Reduces the memory needed by the component tables. The columns holding labels,
+        `from_node`, `to_node`, `node_type` and `hp_type`, and the attributes of type str
+        become categoricals. Numeric attributes are downcast to 32 bit according to
+        their type in the `component_attrs`, or their dtype if they are not listed
+        there, if all values are held exactly.
+
+        The dtypes of the columns change: labels of nodes are categoricals and numbers
+        may be int32 or float32 afterwards. Components added later with :meth:`add_many`
+        or :meth:`batch` are compacted as well. New labels can only be written directly
+        into a categorical column after adding them to its categories, writing other
+        values gives NaN or raises an error.
+        """
+        for list_name, table in self.components.items():
+            self.components[list_name] = self._optimize_table_memory(list_name, table)
+
+        self._memory_optimized = True
+
+    def _optimize_table_memory(self, list_name, table):
+        r"""
+        Returns the component table with compacted columns. The columns `from_node` and
+        `to_node` of the pipes share the labels of all nodes as categories, so that
+        they can be compared and any node can be written into them.
+        """
+        columns = {}
+
+        node_labels = None
+
+        if list_name == 'pipes':
+            node_labels = self.node_index.labels.union(pd.Index(pd.unique(np.concatenate([
+                np.asarray(table[name].dropna().unique(), dtype=object)
+                for name in ['from_node', 'to_node'] if name in table
+            ] + [np.array([], dtype=object)]))))
+
+        for name, column in table.items():
+            attr_type = attr_types.get(list_name, {}).get(name)
+
+            if attr_type is None and pd.api.types.is_integer_dtype(column.dtype):
+                attr_type = 'int'
+
+            elif attr_type is None and pd.api.types.is_float_dtype(column.dtype):
+                attr_type = 'float'
+
+            if node_labels is not None and name in ['from_node', 'to_node']:
+                column = column.astype(pd.CategoricalDtype(node_labels))
+
+            elif name in categorical_attrs or attr_type == 'str':
+                if column.dtype == object:
+                    column = column.astype('category')
+
+                elif isinstance(column.dtype, pd.CategoricalDtype):
+                    column = column.cat.remove_unused_categories()
+
+            elif attr_type == 'int' and column.dtype == np.int64:
+                info = np.iinfo(np.int32)
+
+                if column.empty or info.min <= column.min() and column.max() <= info.max:
+                    column = column.astype(np.int32)
+
+            elif attr_type == 'float' and column.dtype == np.float64:
+                values = column.values.astype(np.float32)
+
+                if np.array_equal(values, column.values, equal_nan=True):
+                    column = column.astype(np.float32)
+
+            columns[name] = column
+
+        return pd.DataFrame(columns, index=table.index, columns=table.columns)
 
     def is_consistent(self):
         r"""
@@ -177,41 +852,58 @@ class ThermalNetwork():
          * pipes connect to existing nodes,
          * pipes do not connect a node with itself,
          * there are no duplicate pipes between two nodes.
+
+        All violations are collected and raised together as one ValueError.
         """
-        nodes = {list_name: self.components[list_name].copy() for list_name in [
-            'consumers',
-            'producers',
-            'forks'
-        ]}
+        def format_items(items, n_max=10):
+            items = list(items)
+
+            if len(items) > n_max:
+                return f"{items[:n_max]} and {len(items) - n_max} more"
 
-        for k, v in nodes.items():
-            v.index = [k + '-' + str(id) for id in v.index]
+            return str(items)
 
-        nodes = pd.concat(nodes.values(), sort=True)
+        pipes = self.components.pipes
 
-        node_indices = nodes.index
+        if pipes.empty:
+            return True
+
+        node_indices = self.node_index.labels
+
+        violations = []
 
-        for id, data in self.components.pipes.iterrows():
+        undefined = pd.unique(np.concatenate([
+            pipes['from_node'].values[~pipes['from_node'].isin(node_indices).values],
+            pipes['to_node'].values[~pipes['to_node'].isin(node_indices).values],
+        ]))
 
-            if not data['from_node'] in node_indices:
-                raise ValueError(f"Node {data['from_node']} not defined.")
+        if len(undefined):
+            violations.append(f"Nodes {format_items(undefined)} not defined.")
 
-            if not data['to_node'] in node_indices:
-                raise ValueError(f"Node {data['to_node']} not defined.")
+        self_loops = pipes.index[
+            pipes['from_node'].values.astype(object) == pipes['to_node'].values.astype(object)
+        ]
 
-            assert data['from_node'] != data['to_node'], \
-                f"Pipe {id} connects {data['from_node']} to itself"
+        if len(self_loops):
+            violations.append(f"Pipes {format_items(self_loops)} connect a node to itself.")
 
-        if not self.components.pipes.empty:
+        duplicates = pipes.loc[
+            pipes.duplicated(['from_node', 'to_node'], keep=False).values,
+            ['from_node', 'to_node']
+        ].drop_duplicates()
 
-            duplicate_pipes = [
-                name for name, group in self.components.pipes.groupby(['from_node', 'to_node'])
-                if len(group) > 1
-            ]
+        if len(duplicates):
+            violations.append(
+                "There is more than one pipe that connects " + format_items(
+                    duplicates['from_node'].astype(str) + ' to '
+                    + duplicates['to_node'].astype(str)
+                ) + "."
+            )
 
-            assert not duplicate_pipes, (
-                f"There is more than one pipe that connects "
-                f"{[pipe[0] + ' to ' + pipe[1] for pipe in duplicate_pipes]}")
+        if violations:
+            raise ValueError(
+                "The thermal network is not consistent:\n * " + "\n * ".join(violations)
+            )
 
         return True
 
@@ -282,8 +974,163 @@ class ThermalNetwork():
         else:
             print("No sequences found to create timeindex from")
 
-    def reproject(self, crs):
-        pass
+    def reproject(self, crs, update_length=True):
+        r"""
+        Transforms the coordinates of the network into another coordinate reference
+        system (CRS).
+
+        The columns `lat` and `lon` of the component tables hold the y and x coordinates
+        in the network's `crs`, which is 'EPSG:4326' unless the network was reprojected.
+        They are transformed together with the shapely geometries in a column
+        `geometry`, with one call of the transformer per table.
+
+        Parameters
+        ----------
+        crs : str or pyproj.CRS
+            Target CRS, e.g. 'EPSG:25833'
+
+        update_length : bool
+            If True, `length_m` of the pipes with a geometry is recomputed from it: on
+            the ellipsoid for a geographic CRS, otherwise in the units of the CRS
+            converted to meters.
+        """
+        if pyproj is None:
+            raise ImportError("Need to install pyproj to reproject the network.")
+
+        crs = pyproj.CRS.from_user_input(crs)
+
+        transformer = pyproj.Transformer.from_crs(
+            pyproj.CRS.from_user_input(self.crs), crs, always_xy=True
+        )
+
+        for list_name, table in self.components.items():
+            self.components[list_name] = self._transform_table(table, transformer)
+
+        self.crs = crs.to_string()
+
+        pipes = self.components['pipes']
+
+        if update_length and 'geometry' in pipes:
+            length = self._get_geometry_length(pipes['geometry'].values, crs)
+
+            known = ~np.isnan(length)
+
+            if 'length_m' in pipes:
+                length[~known] = pipes['length_m'].values[~known]
+
+            if known.any():
+                pipes['length_m'] = length
+
+                self.invalidate_cache()
+
+        if self._memory_optimized:
+            self.optimize_memory()
+
+    @staticmethod
+    def _get_geometries(values):
+        r"""
+        Returns geometries as array of shapely objects with None for missing values.
+        """
+        if shapely is None or not hasattr(shapely, 'get_coordinates'):
+            raise ImportError("Need to install shapely >= 2.0 to transform geometries.")
+
+        geometries = np.array(values, dtype=object)
+
+        geometries[pd.isna(geometries)] = None
+
+        return geometries
+
+    def _transform_table(self, table, transformer):
+        r"""
+        Returns a copy of a component table with the coordinates in `lat` and `lon`
+        and the geometries in `geometry` transformed. Missing coordinates are kept.
+        """
+        has_coordinates = 'lat' in table and 'lon' in table
+
+        if not has_coordinates and 'geometry' not in table:
+            return table
+
+        table = table.copy()
+
+        x, y = np.zeros((2, 0))
+
+        if has_coordinates:
+            lon, lat = table['lon'].values.astype(float), table['lat'].values.astype(float)
+
+            finite = np.isfinite(lon) & np.isfinite(lat)
+
+            x, y = lon[finite], lat[finite]
+
+        if 'geometry' in table:
+            geometries = self._get_geometries(table['geometry'].values)
+
+            coordinates = shapely.get_coordinates(geometries)
+
+            x = np.concatenate([x, coordinates[:, 0]])
+
+            y = np.concatenate([y, coordinates[:, 1]])
+
+        x, y = transformer.transform(x, y)
+
+        x, y = np.asarray(x, dtype=float), np.asarray(y, dtype=float)
+
+        n_points = 0
+
+        if has_coordinates:
+            n_points = finite.sum()
+
+            lon[finite], lat[finite] = x[:n_points], y[:n_points]
+
+            table['lon'], table['lat'] = lon, lat
+
+        if 'geometry' in table:
+            table['geometry'] = shapely.set_coordinates(
+                geometries, np.column_stack([x[n_points:], y[n_points:]])
+            )
+
+            if hasattr(table, 'set_crs'):
+                table = table.set_crs(transformer.target_crs, allow_override=True)
+
+        return table
+
+    @staticmethod
+    def _get_geometry_length(values, crs):
+        r"""
+        Returns the lengths of line geometries in meters, NaN for missing geometries.
+        In a geographic CRS, the geodesic length of the segments is summed up.
+        """
+        geometries = ThermalNetwork._get_geometries(values)
+
+        known = np.flatnonzero(pd.notna(geometries))
+
+        length = np.full(len(geometries), np.nan)
+
+        if not len(known):
+            return length
+
+        if not crs.is_geographic:
+            length[known] = shapely.length(geometries[known]) \
+                * crs.axis_info[0].unit_conversion_factor
+
+            return length
+
+        parts, part_index = shapely.get_parts(geometries[known], return_index=True)
+
+        coordinates, index = shapely.get_coordinates(parts, return_index=True)
+
+        # segments between consecutive points of the same part
+        segment = index[1:] == index[:-1]
+
+        _, _, distance = crs.get_geod().inv(
+            coordinates[:-1, 0][segment], coordinates[:-1, 1][segment],
+            coordinates[1:, 0][segment], coordinates[1:, 1][segment]
+        )
+
+        length[known] = np.bincount(
+            part_index[index[1:][segment]], weights=distance, minlength=len(known)
+        )
+
+        return length
 
     def optimize_operation(self):
         self.results.operation = optimize_operation(self)
@@ -300,3 +1147,6 @@ class ThermalNetwork():
 
     def simulate(self, *args, **kwargs):
         self.results.simulation = simulate(self, *args, **kwargs)
+
+    def simulate_design(self, *args, **kwargs):
+        self.results.simulation = simulate_design(self, *args, **kwargs)
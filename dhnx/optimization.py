@@ -14,6 +14,7 @@ SPDX-License-Identifier: MIT
 import os
 import logging
 import networkx as nx
+import numpy as np
 import pandas as pd
 import oemof.solph as solph
 from oemof.solph import helpers
@@ -138,59 +139,62 @@ class OemofInvestOptimizationModel(InvestOptimizationModel):
 
         # Check 2
 
-        ids_consumers = self.thermal_network.components['consumers'].index
+        pipes = self.thermal_network.components['pipes']
 
-        for p, q in self.thermal_network.components['pipes'].iterrows():
+        node_index = self.thermal_network.node_index
 
-            if (q['from_node'].split('-')[0] == "consumers") and (
-                    q['to_node'].split('-')[0] == "consumers"):
+        from_nodes = node_index.get_indexer(pipes['from_node'])
 
-                raise ValueError(
-                    ""
-                    "Pipe id {} goes from consumer to consumer. This is not "
-                    "allowed!".format(p))
+        to_nodes = node_index.get_indexer(pipes['to_node'])
 
-            if (q['from_node'].split('-')[0] == "producers") and (
-                    q['to_node'].split('-')[0] == "producers"):
+        kind_from = node_index.get_kinds(from_nodes)
 
-                raise ValueError(
-                    ""
-                    "Pipe id {} goes from producers to producers. "
-                    "This is not allowed!".format(p))
+        kind_to = node_index.get_kinds(to_nodes)
 
-            if ((q['from_node'].split('-')[0] == "producers") and (
-                    q['to_node'].split('-')[0] == "consumers")) or ((
-                        q['from_node'].split('-')[0] == "consumers") and (
-                            q['to_node'].split('-')[0] == "producers")):
+        # pipes from a fork to a node that is not defined, but labeled as consumer
+        missing = np.flatnonzero((kind_from == 'forks') & (to_nodes < 0))
 
-                raise ValueError(
-                    ""
-                    "Pipe id {} goes from producers directly "
-                    "to consumers, or vice versa. This is not allowed!"
-                    "".format(p))
+        to_missing_consumer = np.zeros(len(pipes), dtype=bool)
 
-            if (q['from_node'].split('-')[0] == "forks") and (
-                    q['to_node'].split('-')[0] == "consumers"):
+        to_missing_consumer[missing] = pd.Index(
+            np.asarray(pipes['to_node'].values[missing]).astype(str)
+        ).str.startswith('consumers-')
 
-                cons_id = q['to_node'].split('-')[1]
+        connections = [
+            ((kind_from == 'consumers') & (kind_to == 'consumers'),
+             "Pipe id {} goes from consumer to consumer. This is not allowed!"),
+            ((kind_from == 'producers') & (kind_to == 'producers'),
+             "Pipe id {} goes from producers to producers. This is not allowed!"),
+            (((kind_from == 'producers') & (kind_to == 'consumers'))
+             | ((kind_from == 'consumers') & (kind_to == 'producers')),
+             "Pipe id {} goes from producers directly to consumers, or vice versa. "
+             "This is not allowed!"),
+            (to_missing_consumer,
+             "The consumer of pipe id {} does not exist!"),
+        ]
 
-                if cons_id not in ids_consumers:
-                    raise ValueError(
-                        ""
-                        "The consumer of pipe id {} does not exist!".format(p))
+        # raise the error of the first pipe that is not allowed, in the order of the checks
+        violations = np.array([not_allowed for not_allowed, _ in connections])
 
-        pipe_to_cons_ids = list(self.thermal_network.components['pipes']['to_node'].values)
-        pipe_to_cons_ids = [x.split('-')[1] for x in pipe_to_cons_ids
-                            if x.split('-')[0] == 'consumers']
+        if violations.any():
+            position = np.flatnonzero(violations.any(axis=0))[0]
 
-        for id in list(self.thermal_network.components['consumers'].index):
-            if id not in pipe_to_cons_ids:
-                raise ValueError(
-                    "The consumer id {} has no connection the the grid!".format(id))
+            message = connections[np.flatnonzero(violations[:, position])[0]][1]
+
+            raise ValueError(message.format(pipes.index[position]))
+
+        consumers = node_index.get_nodes_of('consumers')
+
+        not_connected = consumers[~np.isin(consumers, to_nodes)]
+
+        if len(not_connected):
+            raise ValueError(
+                "The consumer id {} has no connection the the grid!".format(
+                    node_index.component_ids[not_connected[0]]))
 
         # Check 3
         # check if all components of network are connected
-        self.thermal_network.nx_graph = self.thermal_network.to_nx_graph()
+        self.thermal_network.nx_graph = self.thermal_network.graph
         g = nx.Graph(self.thermal_network.nx_graph)
         if not nx.is_connected(g):
             nx_sum = [len(c) for c in sorted(nx.connected_components(g), key=len, reverse=True)]
@@ -422,13 +426,18 @@ class OemofInvestOptimizationModel(InvestOptimizationModel):
     def get_results_edges(self):
         """Postprocessing of the investment results of the pipes."""
 
-        def get_invest_val(lab):
+        res = self.es.results['main']
 
-            res = self.es.results['main']
+        # the flows are looked up by the label of their source, which is built once
+        outflows = {}
 
-            outflow = [x for x in res.keys()
-                       if x[1] is not None
-                       if lab == str(x[0].label)]
+        for x in res.keys():
+            if x[1] is not None:
+                outflows.setdefault(str(x[0].label), []).append(x)
+
+        def get_invest_val(lab):
+
+            outflow = outflows.get(lab, [])
 
             if len(outflow) > 1:
                 print('Multiple IDs!')
@@ -450,11 +459,7 @@ class OemofInvestOptimizationModel(InvestOptimizationModel):
 
         def get_invest_status(lab):
 
-            res = self.es.results['main']
-
-            outflow = [x for x in res.keys()
-                       if x[1] is not None
-                       if lab == str(x[0].label)]
+            outflow = outflows.get(lab, [])
 
             try:
                 invest_status = res[outflow[0]]['scalars']['invest_status']
@@ -476,10 +481,12 @@ class OemofInvestOptimizationModel(InvestOptimizationModel):
             label_base = 'infrastructure_' + 'heat_' + hp_lab + '_'
 
             # maybe slow approach with lambda function
-            df[hp_lab + '.' + 'dir-1'] = df['from_node'] + '-' + df['to_node']
+            df[hp_lab + '.' + 'dir-1'] = \
+                df['from_node'].astype(str) + '-' + df['to_node'].astype(str)
             df[hp_lab + '.' + 'size-1'] = df[hp_lab + '.' + 'dir-1'].apply(
                 lambda x: get_invest_val(label_base + x))
-            df[hp_lab + '.' + 'dir-2'] = df['to_node'] + '-' + df['from_node']
+            df[hp_lab + '.' + 'dir-2'] = \
+                df['to_node'].astype(str) + '-' + df['from_node'].astype(str)
             df[hp_lab + '.' + 'size-2'] = df[hp_lab + '.' + 'dir-2'].apply(
                 lambda x: get_invest_val(label_base + x))
 
@@ -150,7 +150,7 @@ def add_sources(on, it, c, labels, nodes, busd):
 
         # add timeseries data if present
         if ts_status:
-            ts_key = labels['l_4'].split('-')[1] + '_' + labels['l_2']
+            ts_key = str(c.name) + '_' + labels['l_2']
             for col in ts.columns.values:
                 if col.split('.')[0] == ts_key:
                     outflow_args[col.split('.')[1]] = ts[col].values
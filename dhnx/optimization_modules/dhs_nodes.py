@@ -61,8 +61,17 @@ def add_nodes_dhs(opti_network, gd, nodes, busd):
         nodes.append(bus)
         busd[l_bus] = bus
 
+    # the kinds of the nodes are looked up once for all pipes
+    pipes = opti_network.thermal_network.components['pipes']
+
+    node_index = opti_network.thermal_network.node_index
+
+    kinds_from = node_index.get_kinds(node_index.get_indexer(pipes['from_node']))
+
+    kinds_to = node_index.get_kinds(node_index.get_indexer(pipes['to_node']))
+
     # add heatpipes for all lines
-    for p, q in opti_network.thermal_network.components['pipes'].iterrows():
+    for (p, q), typ_from, typ_to in zip(pipes.iterrows(), kinds_from, kinds_to):
 
         pipe_data = opti_network.invest_options['network']['pipes']
 
@@ -75,9 +84,6 @@ def add_nodes_dhs(opti_network, gd, nodes, busd):
             l_1_in = 'infrastructure'
             l_1_out = 'infrastructure'
 
-            typ_from = q['from_node'].split('-')[0]
-            typ_to = q['to_node'].split('-')[0]
-
             if (typ_from == 'forks') and (typ_to == 'consumers'):
                 l_1_out = 'consumers'
 
@@ -132,7 +138,7 @@ def add_nodes_dhs(opti_network, gd, nodes, busd):
 
         else:   # calls Investment heatpipeline function
             # connection of houses
-            if q['to_node'].split('-')[0] == "consumers":
+            if typ_to == "consumers":
 
                 start = q['from_node']
                 end = q['to_node']
@@ -145,12 +151,12 @@ def add_nodes_dhs(opti_network, gd, nodes, busd):
                     pipe_data, d_labels, gd, q, b_in, b_out,
                     nodes)
 
-            elif q['from_node'].split('-')[0] == "consumers":
+            elif typ_from == "consumers":
                 raise ValueError(
                     "Pipes must not go from 'consumers'!"
                     " Existing heatpipe id {}".format(p))
 
-            elif q['to_node'].split('-')[0] == "producers":
+            elif typ_to == "producers":
 
                 start = q['to_node']
                 end = q['from_node']
@@ -164,7 +170,7 @@ def add_nodes_dhs(opti_network, gd, nodes, busd):
                     gd, q, b_in, b_out,
                     nodes)
 
-            elif q['from_node'].split('-')[0] == "producers":
+            elif typ_from == "producers":
 
                 start = q['from_node']
                 end = q['to_node']
@@ -177,8 +183,7 @@ def add_nodes_dhs(opti_network, gd, nodes, busd):
                     pipe_data, d_labels, gd, q, b_in, b_out,
                     nodes)
 
-            elif (q['from_node'].split('-')[0] == 'forks') and (
-                    q['to_node'].split('-')[0] == 'forks'):
+            elif (typ_from == 'forks') and (typ_to == 'forks'):
 
                 b_in = busd[(d_labels['l_1'], d_labels['l_2'], 'bus', q['from_node'])]
                 b_out = busd[(d_labels['l_1'], d_labels['l_2'], 'bus', q['to_node'])]
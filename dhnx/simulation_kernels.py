@@ -0,0 +1,371 @@
+# -*- coding: utf-8
+
+"""
+This module is designed to hold the array kernels of the simulation model:
+tree traversal for the mass flows and the pressure losses along the paths,
+propagation of temperatures along the tree and calculation of the heat losses.
+
+Every kernel is implemented with numpy. If numba is installed, compiled versions
+of the kernels are available that give identical results, also in single precision.
+They are cached on disk, so they are only compiled once and not in every process.
+
+The traversal kernels process the network level by level. Pipes (or nodes) are
+passed in an order in which every level is contiguous, together with a pointer
+array marking the start of each level. The numpy kernels vectorize within each
+level, the numba kernels simply loop over the given order.
+
+This file is part of project dhnx (). It's copyrighted
+by the contributors recorded in the version control history of the file,
+available from its original location:
+
+SPDX-License-Identifier: MIT
+"""
+
+import logging
+
+import numpy as np
+
+from .helpers import Dict
+
+numba_installed = True
+
+try:
+    import numba
+
+except ImportError:
+    logging.info("Numba is not installed. Simulation uses numpy kernels.")
+    numba_installed = False
+
+
+def accumulate_mass_flow_numpy(node_mass_flow, pipe_order, pipe_ptr, upstream, downstream, sign):
+    r"""
+    Determines the mass flow in all pipes of a tree network by accumulating
+    the mass flows of the nodes from the leaves towards the producer.
+
+    Parameters
+    ----------
+    node_mass_flow : np.ndarray
+        Mass flow at the nodes for every time step [kg/s]
+
+    pipe_order : np.ndarray
+        Pipes ordered by decreasing distance of their downstream node to the producer
+
+    pipe_ptr : np.ndarray
+        Start of every level in `pipe_order`
+
+    upstream : np.ndarray
+        Index of the node of every pipe closer to the producer
+
+    downstream : np.ndarray
+        Index of the node of every pipe further away from the producer
+
+    sign : np.ndarray
+        +1 if a pipe points away from the producer, -1 otherwise
+
+    Returns
+    -------
+    pipes_mass_flow : np.ndarray
+        Mass flow in the pipes for every time step [kg/s]
+    """
+    accumulated = node_mass_flow.copy()
+
+    pipes_mass_flow = np.zeros((node_mass_flow.shape[0], len(sign)), dtype=node_mass_flow.dtype)
+
+    for level in range(len(pipe_ptr) - 1):
+        pipes = pipe_order[pipe_ptr[level]:pipe_ptr[level + 1]]
+
+        pipes_mass_flow[:, pipes] = sign[pipes] * accumulated[:, downstream[pipes]]
+
+        np.add.at(accumulated, (slice(None), upstream[pipes]), accumulated[:, downstream[pipes]])
+
+    return pipes_mass_flow
+
+
+def accumulate_path_losses_numpy(pipes_losses, pipe_order, pipe_ptr, upstream, downstream):
+    r"""
+    Determines the losses along the paths from the producer to all nodes of a tree
+    network by accumulating the losses of the pipes from the producer outwards.
+
+    Parameters
+    ----------
+    pipes_losses : np.ndarray
+        Losses in the pipes for every time step, e.g. pressure losses [Pa]
+
+    pipe_order : np.ndarray
+        Pipes ordered by decreasing distance of their downstream node to the producer
+
+    pipe_ptr : np.ndarray
+        Start of every level in `pipe_order`
+
+    upstream : np.ndarray
+        Index of the node of every pipe closer to the producer
+
+    downstream : np.ndarray
+        Index of the node of every pipe further away from the producer
+
+    Returns
+    -------
+    nodes_losses : np.ndarray
+        Losses along the path from the producer to every node for every time step
+    """
+    # In a tree, there is one node more than there are pipes.
+    nodes_losses = np.zeros((pipes_losses.shape[0], len(upstream) + 1), dtype=pipes_losses.dtype)
+
+    for level in range(len(pipe_ptr) - 2, -1, -1):
+        pipes = pipe_order[pipe_ptr[level]:pipe_ptr[level + 1]]
+
+        nodes_losses[:, downstream[pipes]] = \
+            nodes_losses[:, upstream[pipes]] + pipes_losses[:, pipes]
+
+    return nodes_losses
+
+
+def propagate_temps_numpy(
+        theta, factor, offset, node_order, node_ptr, pipe_order, pipe_ptr, target, source, degree
+):
+    r"""
+    Propagates temperatures along the network. The temperature difference to the
+    environment at a node is the mean of the temperature differences at the
+    neighbouring nodes, each reduced by the factor of the connecting pipe, plus the
+    known temperature difference at the node.
+
+    If the environment temperature of a pipe differs from the one of the nodes by an
+    offset, the temperature difference at the end of the pipe approaches the offset
+    instead of zero.
+
+    Parameters
+    ----------
+    theta : np.ndarray
+        Known temperature differences to the environment for every time step and node [K]
+
+    factor : np.ndarray
+        Cooling factor of every pipe for every time step [-]
+
+    offset : np.ndarray
+        Difference of the environment temperature of every pipe to the one of the
+        nodes for every time step [K]
+
+    node_order : np.ndarray
+        Nodes ordered by levels so that all neighbours that a node depends on
+        are in previous levels
+
+    node_ptr : np.ndarray
+        Start of every level in `node_order`
+
+    pipe_order : np.ndarray
+        Pipes ordered by the level of their target node
+
+    pipe_ptr : np.ndarray
+        Start of every level in `pipe_order`
+
+    target : np.ndarray
+        Index of the node of every pipe whose temperature is calculated
+
+    source : np.ndarray
+        Index of the node of every pipe whose temperature is known
+
+    degree : np.ndarray
+        Number of pipes leading to each node [-]
+
+    Returns
+    -------
+    theta : np.ndarray
+        Temperature differences to the environment for every time step and node [K]
+    """
+    theta = theta.copy()
+
+    accumulated = np.zeros_like(theta)
+
+    for level in range(len(node_ptr) - 1):
+        pipes = pipe_order[pipe_ptr[level]:pipe_ptr[level + 1]]
+
+        nodes = node_order[node_ptr[level]:node_ptr[level + 1]]
+
+        np.add.at(
+            accumulated,
+            (slice(None), target[pipes]),
+            factor[:, pipes] * theta[:, source[pipes]] + (1 - factor[:, pipes]) * offset[:, pipes]
+        )
+
+        nodes = nodes[degree[nodes] > 0]
+
+        theta[:, nodes] += accumulated[:, nodes] / degree[nodes]
+
+    return theta
+
+
+def pipes_heat_losses_numpy(mass_flow, temp_node, from_node, to_node, c):
+    r"""
+    Calculates the pipes' heat losses given the temperatures at the nodes.
+
+    .. math::
+
+        \dot{Q}_{losses} = c \cdot \dot{m} \cdot \Delta T
+
+    Parameters
+    ----------
+    mass_flow : np.ndarray
+        Mass flow in the pipes for every time step [kg/s]
+
+    temp_node : np.ndarray
+        Temperatures at the nodes for every time step [°C]
+
+    from_node : np.ndarray
+        Index of the node every pipe starts at
+
+    to_node : np.ndarray
+        Index of the node every pipe ends at
+
+    c : float
+        Heat capacity [J/(kg*K)]
+
+    Returns
+    -------
+    pipes_heat_losses : np.ndarray
+        Heat losses in the pipes [W]
+    """
+    return c * mass_flow * np.abs(temp_node[:, to_node] - temp_node[:, from_node])
+
+
+if numba_installed:
+
+    @numba.njit(cache=True)
+    def accumulate_mass_flow_numba(
+            node_mass_flow, pipe_order, pipe_ptr, upstream, downstream, sign
+    ):
+        r"""
+        Compiled version of :func:`accumulate_mass_flow_numpy`.
+        """
+        accumulated = node_mass_flow.copy()
+
+        pipes_mass_flow = np.zeros(
+            (node_mass_flow.shape[0], len(sign)), dtype=node_mass_flow.dtype
+        )
+
+        for level in range(len(pipe_ptr) - 1):
+            for i in range(pipe_ptr[level], pipe_ptr[level + 1]):
+                pipe = pipe_order[i]
+
+                for t in range(node_mass_flow.shape[0]):
+                    pipes_mass_flow[t, pipe] = sign[pipe] * accumulated[t, downstream[pipe]]
+
+                    accumulated[t, upstream[pipe]] += accumulated[t, downstream[pipe]]
+
+        return pipes_mass_flow
+
+    @numba.njit(cache=True)
+    def accumulate_path_losses_numba(pipes_losses, pipe_order, pipe_ptr, upstream, downstream):
+        r"""
+        Compiled version of :func:`accumulate_path_losses_numpy`.
+        """
+        nodes_losses = np.zeros(
+            (pipes_losses.shape[0], len(upstream) + 1), dtype=pipes_losses.dtype
+        )
+
+        for level in range(len(pipe_ptr) - 2, -1, -1):
+            for i in range(pipe_ptr[level], pipe_ptr[level + 1]):
+                pipe = pipe_order[i]
+
+                for t in range(pipes_losses.shape[0]):
+                    nodes_losses[t, downstream[pipe]] = \
+                        nodes_losses[t, upstream[pipe]] + pipes_losses[t, pipe]
+
+        return nodes_losses
+
+    @numba.njit(cache=True)
+    def propagate_temps_numba(
+            theta, factor, offset, node_order, node_ptr, pipe_order, pipe_ptr, target, source,
+            degree
+    ):
+        r"""
+        Compiled version of :func:`propagate_temps_numpy`.
+        """
+        theta = theta.copy()
+
+        accumulated = np.zeros_like(theta)
+
+        for level in range(len(node_ptr) - 1):
+            for i in range(pipe_ptr[level], pipe_ptr[level + 1]):
+                pipe = pipe_order[i]
+
+                for t in range(theta.shape[0]):
+                    accumulated[t, target[pipe]] += factor[t, pipe] * theta[t, source[pipe]] \
+                        + (1 - factor[t, pipe]) * offset[t, pipe]
+
+            for i in range(node_ptr[level], node_ptr[level + 1]):
+                node = node_order[i]
+
+                if degree[node] > 0:
+                    for t in range(theta.shape[0]):
+                        theta[t, node] += accumulated[t, node] / degree[node]
+
+        return theta
+
+    @numba.njit(cache=True)
+    def pipes_heat_losses_numba(mass_flow, temp_node, from_node, to_node, c):
+        r"""
+        Compiled version of :func:`pipes_heat_losses_numpy`.
+        """
+        pipes_heat_losses = np.empty_like(mass_flow)
+
+        # c is cast to the dtype of the mass flow, as numpy does for a Python float
+        c_array = np.empty(1, dtype=mass_flow.dtype)
+
+        c_array[0] = c
+
+        c = c_array[0]
+
+        for t in range(mass_flow.shape[0]):
+            for pipe in range(mass_flow.shape[1]):
+                pipes_heat_losses[t, pipe] = c * mass_flow[t, pipe] * np.abs(
+                    temp_node[t, to_node[pipe]] - temp_node[t, from_node[pipe]]
+                )
+
+        return pipes_heat_losses
+
+else:
+    accumulate_mass_flow_numba = None
+
+    accumulate_path_losses_numba = None
+
+    propagate_temps_numba = None
+
+    pipes_heat_losses_numba = None
+
+
+def get_kernels(use_numba=None):
+    r"""
+    Returns the simulation kernels.
+
+    Parameters
+    ----------
+    use_numba : bool or None
+        If True, the compiled kernels are returned, if False, the numpy kernels.
+        If None, the compiled kernels are returned if numba is installed.
+
+    Returns
+    -------
+    kernels : dict
+        Dictionary with the kernels `accumulate_mass_flow`, `accumulate_path_losses`,
+        `propagate_temps` and `pipes_heat_losses`
+    """
+    if use_numba is None:
+        use_numba = numba_installed
+
+    if use_numba and not numba_installed:
+        raise ImportError("Numba has to be installed to use the compiled kernels.")
+
+    if use_numba:
+        return Dict(
+            accumulate_mass_flow=accumulate_mass_flow_numba,
+            accumulate_path_losses=accumulate_path_losses_numba,
+            propagate_temps=propagate_temps_numba,
+            pipes_heat_losses=pipes_heat_losses_numba,
+        )
+
+    return Dict(
+        accumulate_mass_flow=accumulate_mass_flow_numpy,
+        accumulate_path_losses=accumulate_path_losses_numpy,
+        propagate_temps=propagate_temps_numpy,
+        pipes_heat_losses=pipes_heat_losses_numpy,
+    )
@@ -28,6 +28,8 @@ setup(
     extras_require={
         'cartopy': ['cartopy'],
         'geopandas': ['geopandas'],
+        'numba': ['numba'],
         'osmnx': ['osmnx'],
+        'pyproj': ['pyproj', 'shapely'],
     }
 )
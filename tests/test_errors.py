@@ -13,6 +13,7 @@ SPDX-License-Identifier: MIT
 import os
 
 import copy
+import pandas as pd
 import pytest
 
 import dhnx
@@ -24,6 +25,8 @@ dir_import = os.path.join(basedir, '_files/looped_network_import')
 
 dir_import_inconsistent = os.path.join(basedir, '_files/inconsistent_network_import')
 
+dir_import_tree = os.path.join(basedir, '_files/tree_network_import')
+
 thermal_network = dhnx.network.ThermalNetwork(dir_import)
 
 dir_import_invest = os.path.join(basedir, '_files/investment/')
@@ -90,3 +93,64 @@ def test_prod_cons():
         tn_invest_wrong_3 = copy.deepcopy(tn_invest)
         tn_invest_wrong_3.components['pipes'].at[0, 'to_node'] = 'consumers-0'
         dhnx.optimization.setup_optimise_investment(tn_invest_wrong_3, invest_opt)
+
+
+def test_missing_consumer():
+    # there is a pipe from a fork to a consumer that does not exist
+    with pytest.raises(ValueError, match=r"The consumer of pipe id 10 does not exist"):
+        tn_invest_wrong_4 = copy.deepcopy(tn_invest)
+        tn_invest_wrong_4.components['pipes'].at[10, 'to_node'] = 'consumers-5'
+        dhnx.optimization.setup_optimise_investment(tn_invest_wrong_4, invest_opt)
+
+
+def test_unknown_temp_env_zone():
+    # the pipes refer to a zone that has no environment temperature
+    with pytest.raises(ValueError, match=r"are not found in the environment's temp_env"):
+        tn_zone_wrong = dhnx.network.ThermalNetwork(dir_import_tree)
+        tn_zone_wrong.components['pipes']['temp_env_zone'] = 'ground'
+        dhnx.simulation.simulate(tn_zone_wrong)
+
+
+def test_heat_flow_without_temperature_drop():
+    # the mass flow cannot be derived from the heat demand without a temperature drop
+    with pytest.raises(ValueError, match=r"have a heat demand but no positive temperature_drop"):
+        tn_heat_wrong = dhnx.network.ThermalNetwork(dir_import_tree)
+        tn_heat_wrong.sequences.consumers['heat_flow'] = \
+            tn_heat_wrong.sequences.consumers.pop('mass_flow') * 1e5
+        tn_heat_wrong.sequences.consumers.temperature_drop['1'] = 0
+        dhnx.simulation.simulate(tn_heat_wrong)
+
+
+def test_add_many_missing_required():
+    # pipes need a from_node and to_node
+    with pytest.raises(ValueError, match=r"Required attributes \['to_node'\] are not given"):
+        tn_add_wrong = dhnx.network.ThermalNetwork(dir_import_tree)
+        tn_add_wrong.add_many('Pipe', [{'id': 5, 'from_node': 'forks-0'}])
+
+
+def test_inconsistent_report():
+    # all violations are reported together
+    tn_inconsistent = dhnx.network.ThermalNetwork(dir_import_tree)
+    tn_inconsistent.components['pipes'].loc[5] = ['forks-0', 'forks-0', 1, 1, 1, 1]
+    tn_inconsistent.components['pipes'].loc[6] = ['forks-9', 'consumers-0', 1, 1, 1, 1]
+    with pytest.raises(ValueError, match=r"(?s)Nodes \['forks-9'\] not defined.*Pipes \[5\]"):
+        tn_inconsistent.is_consistent()
+
+
+def test_batch_rollback():
+    # the network is rolled back if it is not consistent after the batch
+    tn_batch_wrong = dhnx.network.ThermalNetwork(dir_import_tree)
+    pipes = tn_batch_wrong.components['pipes'].copy()
+    with pytest.raises(ValueError, match=r"Nodes \['consumers-0'\] not defined"):
+        with tn_batch_wrong.batch():
+            tn_batch_wrong.add('Consumer', 2, lat=1, lon=1)
+            tn_batch_wrong.remove('Consumer', 0)
+    assert list(tn_batch_wrong.components['consumers'].index) == [0, 1]
+    pd.testing.assert_frame_equal(tn_batch_wrong.components['pipes'], pipes)
+
+
+def test_aggregate_consumers_cell_size():
+    # grouping by cell needs the size of the cells
+    tn_aggregate_wrong = dhnx.network.ThermalNetwork(dir_import_tree)
+    with pytest.raises(ValueError, match=r"A cell_size is needed"):
+        tn_aggregate_wrong.aggregate_consumers(by='cell')
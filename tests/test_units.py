@@ -12,6 +12,8 @@ SPDX-License-Identifier: MIT
 import os
 
 import numpy as np
+import pandas as pd
+import pytest
 
 import dhnx
 
@@ -20,6 +22,8 @@ basedir = os.path.dirname(__file__)
 
 dir_import = os.path.join(basedir, '_files/looped_network_import')
 
+dir_import_tree = os.path.join(basedir, '_files/tree_network_import')
+
 thermal_network = dhnx.network.ThermalNetwork(dir_import)
 
 
@@ -29,7 +33,848 @@ def test_add():
     assert thermal_network.components['producers'].loc[5].to_list() == [1., 1., np.nan]
 
 
+def test_add_many():
+    network = dhnx.network.ThermalNetwork(dir_import_tree)
+
+    network.add_many('Consumer', [
+        {'id': 2, 'lat': 1, 'lon': 1, 'node_type': 'consumer'},
+        {'id': 3, 'lat': 2, 'lon': 2},
+    ])
+
+    network.add_many('ThermalStorage', pd.DataFrame(
+        {'node': 'consumers-2', 'capacity_kWh': 1, 'power_kW': 1, 'load_limit_kW': 1},
+        index=[0]
+    ))
+
+    assert list(network.components['consumers'].index) == [0, 1, 2, 3]
+
+    assert network.components['consumers'].loc[3, 'lat'] == 2
+
+    assert network.components['thermal_storages'].loc[0, 'soc_initial'] == 0.5
+
+
+def test_batch():
+    network = dhnx.network.ThermalNetwork(dir_import_tree)
+
+    with network.batch():
+        network.add('Consumer', 2, lat=1, lon=1)
+        network.add('Consumer', 3, lat=2, lon=2)
+        network.remove('Consumer', 3)
+        network.remove('Pipe', 2)
+        network.add_many('Pipe', [
+            {'id': 5, 'from_node': 'forks-0', 'to_node': 'consumers-2', 'length_m': 10},
+        ])
+
+        assert 2 not in network.components['consumers'].index
+
+    assert list(network.components['consumers'].index) == [0, 1, 2]
+
+    assert list(network.components['pipes'].index) == [0, 1, 5]
+
+
+def test_optimize_memory():
+    network = dhnx.network.ThermalNetwork(dir_import_tree)
+
+    assert network.components['pipes']['from_node'].dtype == object
+
+    network = dhnx.network.ThermalNetwork(dir_import_tree, optimize_memory=True)
+
+    pipes = network.components['pipes']
+
+    assert isinstance(pipes['from_node'].dtype, pd.CategoricalDtype)
+
+    assert pipes['to_node'].cat.categories.equals(pipes['from_node'].cat.categories)
+
+    assert pipes['length_m'].dtype == np.int32
+
+    assert pipes['diameter_mm'].dtype == np.int32
+
+    network.add('Consumer', 2, lat=1, lon=1)
+
+    network.components['pipes'].loc[2, 'to_node'] = 'consumers-2'
+
+    network.add_many('Pipe', [
+        {'id': 5, 'from_node': 'forks-0', 'to_node': 'consumers-1', 'length_m': 0.1},
+    ])
+
+    assert isinstance(network.components['pipes']['to_node'].dtype, pd.CategoricalDtype)
+
+    assert network.components['pipes'].loc[5, 'length_m'] == 0.1
+
+    assert network.is_consistent()
+
+
+def test_copy():
+    network = dhnx.network.ThermalNetwork(dir_import_tree, optimize_memory=True)
+
+    copied = network.copy()
+
+    assert copied.memory_optimized
+
+    assert copied.sequences.consumers.mass_flow.equals(network.sequences.consumers.mass_flow)
+
+    copied.components.pipes.loc[0, 'length_m'] = 1
+
+    assert network.components.pipes.loc[0, 'length_m'] != 1
+
+
 def test_remove():
     thermal_network.remove('Consumer', 1)
 
     assert 4 not in thermal_network.components['consumers'].index
+
+
+def test_simulate_incremental():
+    network = dhnx.network.ThermalNetwork(dir_import_tree)
+
+    network.simulate(incremental=True)
+
+    network.components['pipes'].loc[1, 'diameter_mm'] = 50
+
+    network.add('Consumer', 2, lat=51.34, lon=12.38, node_type='consumer')
+
+    network.add(
+        'Pipe', 3, from_node='forks-0', to_node='consumers-2', length_m=50, diameter_mm=32,
+        **{'heat_transfer_coefficient_W/mK': 0.21, 'roughness_mm': 0.4}
+    )
+
+    network.sequences['consumers']['mass_flow']['2'] = [0.2, 0.1, 0.3]
+
+    network.sequences['consumers']['temperature_drop']['2'] = 15
+
+    network.simulate(incremental=True)
+
+    expected = dhnx.simulation.simulate(network)
+
+    for key, value in expected.items():
+        if value is None:
+            assert network.results['simulation'][key] is None
+
+        else:
+            assert np.allclose(network.results['simulation'][key].values, value.values)
+
+
+def test_simulate_incremental_restricted():
+    network = dhnx.network.ThermalNetwork(dir_import_tree)
+
+    model = dhnx.simulation.SimulationModelNumpy(network, max_update_share=1)
+
+    model.prepare()
+
+    model.solve()
+
+    propagated = []
+
+    propagate_temps = model.kernels.propagate_temps
+
+    def count_nodes(theta, factor, offset, **order):
+        propagated.append(len(order['node_order']))
+
+        return propagate_temps(theta, factor, offset, **order)
+
+    model.kernels.propagate_temps = count_nodes
+
+    network.components['pipes'].loc[2, 'diameter_mm'] = 50
+
+    model.update()
+
+    # only the consumer at the end of the pipe for the inlet, and its path to the
+    # producer for the return
+    assert propagated == [1, 3]
+
+    expected = dhnx.simulation.simulate(network)
+
+    for key, value in expected.items():
+        if value is not None:
+            assert np.allclose(model.get_results()[key].values, value.values)
+
+
+@pytest.mark.parametrize('use_numba', [
+    False,
+    pytest.param(True, marks=pytest.mark.skipif(
+        not dhnx.simulation_kernels.numba_installed, reason="numba is not installed"
+    )),
+])
+def test_simulation_kernels(use_numba):
+    network = dhnx.network.ThermalNetwork(dir_import_tree)
+
+    model = dhnx.simulation.SimulationModelNumpy(network, use_numba=use_numba)
+
+    model.prepare()
+
+    model.solve()
+
+    results = model.get_results()
+
+    assert np.allclose(results['pipes-mass_flow'].loc[0].values, [0.68, 0.34, 0.34])
+
+    assert np.allclose(
+        results['nodes-temp_inlet'].loc[0].values,
+        [130.0, 129.365075, 129.162674, 129.162674]
+    )
+
+    assert np.allclose(
+        results['nodes-temp_return'].loc[0].values,
+        [118.407842, 118.979154, 119.162674, 119.162674]
+    )
+
+    assert np.allclose(
+        results['pipes-heat_losses'].loc[0].values,
+        [3436.811672, 549.782397, 549.782397]
+    )
+
+    expected = dhnx.simulation.SimulationModelNumpy(network, use_numba=False)
+
+    expected.prepare()
+
+    expected.solve()
+
+    for key, value in expected.get_results().items():
+        if value is not None:
+            assert np.array_equal(results[key].values, value.values)
+
+
+@pytest.mark.skipif(not dhnx.simulation_kernels.numba_installed, reason="numba is not installed")
+def test_simulation_kernels_float32():
+    network = dhnx.network.ThermalNetwork(dir_import_tree)
+
+    network.add('Fork', 1, lat=51.34, lon=12.38)
+
+    network.add_many('Consumer', [
+        {'id': 2, 'lat': 51.34, 'lon': 12.38, 'node_type': 'consumer'},
+        {'id': 3, 'lat': 51.34, 'lon': 12.38, 'node_type': 'consumer'},
+    ])
+
+    network.add_many('Pipe', [
+        {'id': 3, 'from_node': 'forks-0', 'to_node': 'forks-1', 'length_m': 80},
+        {'id': 4, 'from_node': 'forks-1', 'to_node': 'consumers-2', 'length_m': 30},
+        {'id': 5, 'from_node': 'forks-1', 'to_node': 'consumers-3', 'length_m': 45},
+    ])
+
+    network.components.pipes.loc[[3, 4, 5], 'diameter_mm'] = [63, 32, 32]
+
+    network.components.pipes.loc[[3, 4, 5], ['heat_transfer_coefficient_W/mK', 'roughness_mm']] \
+        = [0.21, 0.4]
+
+    network.sequences['consumers']['mass_flow'][['2', '3']] = [[0.2, 0.1], [0.1, 0.3], [0.3, 0.2]]
+
+    network.sequences['consumers']['temperature_drop'][['2', '3']] = [15, 20]
+
+    results = {}
+
+    for use_numba in [False, True]:
+        model = dhnx.simulation.SimulationModelNumpy(
+            network, use_numba=use_numba, dtype=np.float32
+        )
+
+        model.prepare()
+
+        model.solve()
+
+        results[use_numba] = model.get_results()
+
+    for key, value in results[False].items():
+        if value is not None:
+            assert value.values.dtype == results[True][key].values.dtype
+
+            assert np.array_equal(results[True][key].values, value.values)
+
+
+def test_simulate_pipes_temp_env():
+    expected_network = dhnx.network.ThermalNetwork(dir_import_tree)
+
+    expected_network.sequences.environment.temp_env['temp_env'] = 10.
+
+    expected = dhnx.simulation.simulate(expected_network)
+
+    network = dhnx.network.ThermalNetwork(dir_import_tree)
+
+    network.sequences.environment.temp_env['ground'] = 10.
+
+    network.components.pipes['temp_env_zone'] = 'ground'
+
+    results_zones = dhnx.simulation.simulate(network)
+
+    network = dhnx.network.ThermalNetwork(dir_import_tree)
+
+    network.sequences['pipes']['temp_env'] = pd.DataFrame(
+        10., index=network.timeindex, columns=['0', '1', '2']
+    )
+
+    results_pipes = dhnx.simulation.simulate(network)
+
+    for key in ['nodes-temp_inlet', 'nodes-temp_return', 'pipes-heat_losses']:
+        assert np.allclose(results_zones[key].values, expected[key].values)
+
+        assert np.allclose(results_pipes[key].values, expected[key].values)
+
+
+def test_simulate_profile():
+    network = dhnx.network.ThermalNetwork(dir_import_tree)
+
+    assert 'simulation-profile' not in dhnx.simulation.simulate(network)
+
+    report = dhnx.simulation.simulate(network, profile=True)['simulation-profile']
+
+    assert list(report.loc[report['depth'] == 0, 'stage']) == ['prepare', 'solve']
+
+    assert 'calculate_pipes_mass_flow' in list(report['stage'])
+
+    assert (report['wall_time_s'] >= 0).all()
+
+    assert (report['peak_memory_bytes'] >= 0).all()
+
+    assert report.set_index('stage').loc['calculate_pipes_mass_flow', 'nbytes'] == 3 * 3 * 8
+
+    dhnx.simulation.simulate(network, incremental=True)
+
+    network.components['pipes'].loc[1, 'diameter_mm'] = 50
+
+    report = dhnx.simulation.simulate(network, incremental=True, profile=True)
+
+    assert list(report['simulation-profile']['stage'])[0] == 'update'
+
+    assert 'simulation-profile' not in dhnx.simulation.simulate(network, incremental=True)
+
+
+def test_simulation_results():
+    network = dhnx.network.ThermalNetwork(dir_import_tree)
+
+    results = dhnx.simulation.simulate(network)
+
+    assert 'velocity' not in results.arrays
+
+    diameter = 1e-3 * np.array([125, 40, 40])
+
+    assert np.allclose(
+        results['pipes-velocity'].values,
+        4 * results['pipes-mass_flow'].values / (971.78 * np.pi * diameter ** 2)
+    )
+
+    assert 'velocity' in results.arrays
+
+    assert np.allclose(
+        results['consumers-heat_delivered'].loc[0].values, 4190 * 0.34 * 10
+    )
+
+    with pytest.deprecated_call():
+        assert results['pipes_loc_pressure_losses'] is None
+
+
+def test_simulate_float32():
+    network = dhnx.network.ThermalNetwork(dir_import_tree)
+
+    expected = dhnx.simulation.simulate(network)
+
+    results = dhnx.simulation.simulate(network, dtype=np.float32)
+
+    for key in [
+        'pipes-mass_flow', 'pipes-dist_pressure_losses', 'global-pressure_losses',
+        'nodes-temp_inlet', 'nodes-temp_return'
+    ]:
+        assert np.allclose(results[key].values, expected[key].values, rtol=1e-5, atol=0)
+
+    assert results['nodes-temp_inlet'].values.dtype == np.float32
+
+    assert np.allclose(
+        results['global-heat_losses'], expected['global-heat_losses'], rtol=1e-4, atol=0
+    )
+
+    max_error = 4190 * expected['pipes-mass_flow'].abs() * 1e-5 * 130
+
+    assert (
+        (results['pipes-heat_losses'] - expected['pipes-heat_losses']).abs() <= max_error
+    ).all().all()
+
+
+def test_simulate_design():
+    network = dhnx.network.ThermalNetwork(dir_import_tree)
+
+    expected = dhnx.simulation.simulate(network)
+
+    network.components.consumers['mass_flow'] = 0.34
+
+    network.components.consumers['temperature_drop'] = 10
+
+    network.components.producers['temp_inlet'] = 130
+
+    network.simulate_design(temp_env=20)
+
+    results = network.results.simulation
+
+    for key in [
+        'pipes-mass_flow', 'pipes-dist_pressure_losses', 'global-pressure_losses',
+        'nodes-temp_inlet', 'nodes-temp_return', 'pipes-heat_losses', 'global-heat_losses'
+    ]:
+        result = results[key]
+
+        if isinstance(result, pd.DataFrame):
+            expected_result = expected[key][result.columns].values[0]
+
+        else:
+            expected_result = expected[key].values[0]
+
+        assert np.allclose(result.values[0], expected_result)
+
+    # arrays given to the model replace the values of the tables
+    model = dhnx.simulation.SimulationModelDesign(network, temp_env=20)
+
+    arrays = model.simulate_design(
+        diameter_mm=network.components.pipes['diameter_mm'].values * 2,
+        mass_flow=np.full(len(model.consumers), 0.2)
+    )
+
+    network.components.pipes['diameter_mm'] *= 2
+
+    network.components.consumers['mass_flow'] = 0.2
+
+    expected = dhnx.simulation.simulate_design(network, temp_env=20)
+
+    for name, key in [
+        ('mass_flow', 'pipes-mass_flow'), ('dist_pressure_losses', 'pipes-dist_pressure_losses'),
+        ('temp_return', 'nodes-temp_return'), ('global_heat_losses', 'global-heat_losses')
+    ]:
+        assert np.allclose(arrays[name], expected.get_array(key)[0])
+
+
+def test_collapse_degree_2_forks():
+    network = dhnx.network.ThermalNetwork(dir_import_tree)
+
+    with network.batch():
+        network.add('Fork', 1, lat=51.34, lon=12.38)
+        network.remove('Pipe', 1)
+        network.add_many('Pipe', [
+            {'id': 1, 'from_node': 'forks-0', 'to_node': 'forks-1', 'length_m': 60},
+            {'id': 3, 'from_node': 'forks-1', 'to_node': 'consumers-0', 'length_m': 40},
+        ])
+
+    network.components.pipes[['diameter_mm', 'heat_transfer_coefficient_W/mK']] = [40, 0.21]
+
+    network.components.consumers['mass_flow'] = 0.34
+
+    network.components.consumers['temperature_drop'] = 10
+
+    network.components.producers['temp_inlet'] = 130
+
+    simplified, mapping = network.collapse_degree_2_forks()
+
+    assert list(simplified.components.forks.index) == [0]
+
+    assert simplified.components.pipes.loc[1, ['to_node', 'length_m']].tolist() == \
+        ['consumers-0', 100]
+
+    assert mapping['pipe'].to_dict() == {0: 0, 1: 1, 2: 2, 3: 1}
+
+    network.simulate_design(temp_env=20)
+
+    simplified.simulate_design(temp_env=20)
+
+    expected = network.results.simulation
+
+    results = simplified.results.simulation
+
+    mass_flow = dhnx.graph.expand_pipe_results(results['pipes-mass_flow'], mapping)
+
+    assert np.allclose(mass_flow[expected['pipes-mass_flow'].columns], expected['pipes-mass_flow'])
+
+    assert np.allclose(results['global-pressure_losses'], expected['global-pressure_losses'])
+
+    temp_inlet = results['nodes-temp_inlet']
+
+    assert np.allclose(temp_inlet, expected['nodes-temp_inlet'][temp_inlet.columns])
+
+
+def test_collapse_degree_2_forks_sequences():
+    network = dhnx.network.ThermalNetwork()
+
+    network.add('Producer', 0, lat=0, lon=0)
+
+    network.add('Fork', 0, lat=0, lon=1)
+
+    network.add('Consumer', 0, lat=0, lon=2)
+
+    network.add('Pipe', 0, from_node='producers-0', to_node='forks-0', length_m=10)
+
+    network.add('Pipe', 1, from_node='forks-0', to_node='consumers-0', length_m=10)
+
+    # pipes without further attributes are merged
+    simplified, _ = network.collapse_degree_2_forks()
+
+    assert simplified.components.pipes['length_m'].tolist() == [20]
+
+    network.sequences['pipes']['temp_env'] = pd.DataFrame({'0': [10.], '1': [-20.]})
+
+    simplified, _ = network.collapse_degree_2_forks()
+
+    assert list(simplified.components.forks.index) == [0]
+
+    network.sequences['pipes']['temp_env']['1'] = 10.
+
+    simplified, _ = network.collapse_degree_2_forks()
+
+    assert simplified.components.forks.empty
+
+    assert list(simplified.sequences['pipes']['temp_env'].columns) == ['0']
+
+
+def test_aggregate_consumers():
+    network = dhnx.network.ThermalNetwork(dir_import_tree)
+
+    aggregated, mapping = network.aggregate_consumers(by='branch')
+
+    assert list(aggregated.components.consumers.index) == [0]
+
+    assert list(aggregated.components.forks.index) == []
+
+    assert aggregated.components.pipes.loc[0, ['from_node', 'to_node', 'length_m']].tolist() == \
+        ['producers-0', 'consumers-0', 300]
+
+    assert mapping.consumers['consumer'].to_dict() == {0: 0, 1: 0}
+
+    mass_flow = network.sequences.consumers.mass_flow
+
+    assert np.allclose(aggregated.sequences.consumers.mass_flow['0'], mass_flow.sum(axis=1))
+
+    expected = dhnx.simulation.simulate(network)
+
+    results = dhnx.simulation.simulate(aggregated)
+
+    pipes_mass_flow = dhnx.graph.expand_pipe_results(
+        results['pipes-mass_flow'], mapping.pipes, extensive=True, share='flow_share'
+    )
+
+    assert np.allclose(pipes_mass_flow, expected['pipes-mass_flow'][pipes_mass_flow.columns])
+
+    heat_delivered = dhnx.graph.expand_consumer_results(
+        results['consumers-heat_delivered'], mapping.consumers, extensive=True
+    )
+
+    assert np.allclose(
+        heat_delivered.sum(axis=1), expected['consumers-heat_delivered'].sum(axis=1)
+    )
+
+    # consumers in different groups are kept
+    kept, _ = network.aggregate_consumers(by=pd.Series({0: 'a', 1: 'b'}))
+
+    assert list(kept.components.pipes.index) == [0, 1, 2]
+
+    # without mass flow, the temperature drop is the plain mean
+    network.sequences.consumers.mass_flow.iloc[0] = 0
+
+    aggregated, _ = network.aggregate_consumers(by='branch')
+
+    assert np.isclose(
+        aggregated.sequences.consumers.temperature_drop['0'].iloc[0],
+        network.sequences.consumers.temperature_drop.iloc[0].mean()
+    )
+
+
+def test_simulate_heat_flow():
+    network = dhnx.network.ThermalNetwork(dir_import_tree)
+
+    expected = dhnx.simulation.simulate(network)
+
+    mass_flow = network.sequences.consumers.pop('mass_flow')
+
+    network.sequences.consumers['heat_flow'] = \
+        4190 * mass_flow * network.sequences.consumers.temperature_drop
+
+    results = dhnx.simulation.simulate(network)
+
+    for key in ['pipes-mass_flow', 'nodes-temp_return', 'global-heat_losses']:
+        assert np.allclose(results[key].values, expected[key].values)
+
+    assert np.allclose(
+        results['consumers-heat_delivered'].values,
+        network.sequences.consumers.heat_flow.values
+    )
+
+    # a consumer whose mass flow is given needs no temperature drop to derive it
+    network.sequences.consumers['mass_flow'] = mass_flow[['1']]
+
+    network.sequences.consumers.temperature_drop['1'] = 0
+
+    results = dhnx.simulation.simulate(network)
+
+    assert np.allclose(results['pipes-mass_flow'].values, expected['pipes-mass_flow'].values)
+
+
+def test_simulate_timesteps():
+    network = dhnx.network.ThermalNetwork(dir_import_tree)
+
+    expected = dhnx.simulation.simulate(network)
+
+    peak = dhnx.simulation.get_peak_timesteps(network, 1)
+
+    assert list(peak) == [1]
+
+    for timesteps in [slice(1, 3), [False, True, True], [1, 2]]:
+        results = dhnx.simulation.simulate(network, timesteps=timesteps)
+
+        assert list(results['nodes-temp_inlet'].index) == [1, 2]
+
+        assert np.allclose(
+            results['pipes-mass_flow'].values, expected['pipes-mass_flow'].values[1:]
+        )
+
+    results = dhnx.simulation.simulate(network, resample=2)
+
+    mass_flow = expected['pipes-mass_flow'].values
+
+    assert np.allclose(
+        results['pipes-mass_flow'].values, [mass_flow[:2].mean(axis=0), mass_flow[2]]
+    )
+
+
+def test_simulate_storage_and_transfer_station():
+    network = dhnx.network.ThermalNetwork(dir_import_tree)
+
+    network.add(
+        'TransferStation', 0, node='consumers-0', approach_temperature=5,
+        temp_return_secondary=100
+    )
+
+    network.add(
+        'ThermalStorage', 0, node='consumers-1', capacity_kWh=10, power_kW=3,
+        load_limit_kW=14
+    )
+
+    results = dhnx.simulation.simulate(network)
+
+    assert np.allclose(results['nodes-temp_return']['consumers-0'], 105)
+
+    assert np.allclose(
+        results['transfer_stations-temp_supply_secondary'][0],
+        results['nodes-temp_inlet']['consumers-0'] - 5
+    )
+
+    # demand of 14.246, 16.76 and 12.57 kW is shaved to 14 kW
+    assert np.allclose(results['thermal_storages-heat_flow'][0], [246, 2760, -1430])
+
+    assert np.allclose(results['thermal_storages-state_of_charge'][0], [4.754, 1.994, 3.424])
+
+    assert np.allclose(results['consumers-heat_delivered']['consumers-1'], 14000)
+
+
+def test_edge_attribute_store():
+    network = dhnx.network.ThermalNetwork(dir_import_tree)
+
+    graph = network.to_nx_graph()
+
+    results = dhnx.simulation.simulate(network)
+
+    store = results.to_edge_store()
+
+    assert store.edges == list(graph.edges())
+
+    assert store['mass_flow'] is results.get_array('pipes-mass_flow')
+
+    graph_t = store.write_to_graph(graph, names=['mass_flow'], index=1)
+
+    assert 'mass_flow' not in graph.edges['forks-0', 'consumers-0']
+
+    assert graph_t.edges['forks-0', 'consumers-0']['mass_flow'] == \
+        store.get('mass_flow', ('forks-0', 'consumers-0'))[1]
+
+    series = store.to_series('mass_flow', index=0)
+
+    graph_0 = dhnx.graph.write_edge_data_to_graph(series, graph)
+
+    assert graph_0.edges['forks-0', 'consumers-0']['mass_flow'] == \
+        series['forks-0', 'consumers-0']
+
+
+def test_compact_topology():
+    network = dhnx.network.ThermalNetwork(dir_import_tree)
+
+    topology = network.to_compact_topology()
+
+    producer = topology.get_nodes_of('producers')
+
+    depth, parent_edge = topology.get_levels(producer)
+
+    assert list(depth[topology.get_nodes_of('consumers')]) == [2, 2]
+
+    assert parent_edge[producer] == -1
+
+    indptr, entries = topology.get_adjacency('out')
+
+    fork = topology.nodes.get_loc('forks-0')
+
+    assert list(topology.to_node[entries[indptr[fork]:indptr[fork + 1]]]) == \
+        list(topology.get_nodes_of('consumers'))
+
+    graph = topology.to_nx_graph()
+
+    assert list(graph.edges()) == list(network.to_nx_graph().edges())
+
+    assert graph.nodes['consumers-0'] == network.to_nx_graph().nodes['consumers-0']
+
+    round_trip = dhnx.graph.CompactTopology.from_nx_graph(graph)
+
+    assert np.array_equal(round_trip.from_node, topology.from_node)
+
+
+def test_node_index():
+    network = dhnx.network.ThermalNetwork(dir_import_tree)
+
+    node_index = network.node_index
+
+    ids = node_index.get_indexer(['producers-0', 'consumers-1', 'consumers-9'])
+
+    kinds = node_index.get_kinds(ids)
+
+    assert list(kinds[:2]) == ['producers', 'consumers'] and pd.isna(kinds[2])
+
+    assert node_index.component_ids[ids[1]] == 1
+
+    assert list(node_index.get_labels(node_index.get_nodes_of('forks'))) == ['forks-0']
+
+    assert network.node_index is node_index
+
+
+def test_tree_index():
+    network = dhnx.network.ThermalNetwork(dir_import_tree)
+
+    tree_index = network.tree_index
+
+    producer, fork, consumer_0, consumer_1 = network.node_index.get_indexer(
+        ['producers-0', 'forks-0', 'consumers-0', 'consumers-1']
+    )
+
+    assert tree_index.is_tree
+
+    assert set(tree_index.get_subtree(fork)) == {fork, consumer_0, consumer_1}
+
+    assert list(tree_index.is_ancestor(fork, [producer, consumer_1])) == [False, True]
+
+    assert list(tree_index.get_path_to_root(consumer_1)) == [2, 0]
+
+    assert list(tree_index.get_lca([consumer_0, consumer_0], [consumer_1, fork])) == [fork, fork]
+
+    assert list(tree_index.get_subtree_sums(np.ones(4))[[producer, fork]]) == [4, 3]
+
+    assert network.tree_index is tree_index
+
+
+def test_reproject():
+    pyproj = pytest.importorskip('pyproj')
+
+    shapely_geometry = pytest.importorskip('shapely.geometry')
+
+    network = dhnx.network.ThermalNetwork(dir_import_tree)
+
+    forks, consumers = network.components.forks, network.components.consumers
+
+    network.components.pipes['geometry'] = [None, None, shapely_geometry.LineString([
+        (forks.at[0, 'lon'], forks.at[0, 'lat']),
+        (consumers.at[1, 'lon'], consumers.at[1, 'lat']),
+    ])]
+
+    expected = consumers[['lat', 'lon']].astype(float)
+
+    _, _, distance = pyproj.Geod(ellps='WGS84').inv(
+        forks.at[0, 'lon'], forks.at[0, 'lat'], consumers.at[1, 'lon'], consumers.at[1, 'lat']
+    )
+
+    network.reproject('EPSG:25833')
+
+    assert network.crs == 'EPSG:25833'
+
+    assert network.components.consumers['lon'].min() > 1e5
+
+    length = network.components.pipes['length_m']
+
+    assert list(length[:2]) == [200, 100] and np.isclose(length[2], distance, rtol=1e-3)
+
+    network.reproject('EPSG:4326')
+
+    assert np.allclose(network.components.consumers[['lat', 'lon']], expected)
+
+
+def test_fingerprint():
+    network = dhnx.network.ThermalNetwork(dir_import_tree)
+
+    fingerprint = network.fingerprint()
+
+    assert network.fingerprint() == fingerprint
+
+    assert dhnx.network.ThermalNetwork(dir_import_tree).fingerprint() == fingerprint
+
+    network.components.pipes.loc[1, 'diameter_mm'] = 50
+
+    assert network.fingerprint() == fingerprint
+
+    network.invalidate_cache()
+
+    assert network.fingerprint() != fingerprint
+
+    fingerprint = network.fingerprint()
+
+    network.components.pipes.loc[1, 'to_node'] = 'consumers-1'
+
+    assert network.fingerprint() == fingerprint
+
+    network.invalidate_cache()
+
+    assert network.fingerprint() != fingerprint
+
+    fingerprint = network.fingerprint()
+
+    network.sequences.consumers.mass_flow = pd.DataFrame({'0': [1., 2.]})
+
+    assert network.fingerprint() != fingerprint
+
+    fingerprint = network.fingerprint()
+
+    network.sequences.consumers.mass_flow.iloc[1, 0] = 3.
+
+    assert network.fingerprint() == fingerprint
+
+    network.invalidate_cache()
+
+    assert network.fingerprint() != fingerprint
+
+
+def test_nx_graph_to_thermal_network():
+    network = dhnx.network.ThermalNetwork(dir_import_tree)
+
+    converted = dhnx.network.ThermalNetwork.from_nx_graph(network.to_nx_graph())
+
+    for list_name in ['consumers', 'producers', 'forks', 'pipes']:
+        pd.testing.assert_frame_equal(
+            converted.components[list_name],
+            network.components[list_name],
+            check_like=True,
+            check_dtype=False
+        )
+
+    assert converted.is_consistent()
+
+
+def test_cached_graph():
+    network = dhnx.network.ThermalNetwork(dir_import_tree)
+
+    graph = network.graph
+
+    topology = network.topology
+
+    assert network.graph is graph and network.topology is topology
+
+    network.add('Consumer', 2, lat=51.34, lon=12.38, node_type='consumer')
+
+    assert network.graph is not graph
+
+    graph = network.graph
+
+    network.components.pipes.loc[2, 'to_node'] = 'consumers-2'
+
+    assert network.graph is graph
+
+    network.invalidate_cache()
+
+    assert ('forks-0', 'consumers-2') in network.graph.edges()
+
+    network.components['pipes'] = network.components.pipes.iloc[:2]
+
+    assert network.topology.n_edges == 2